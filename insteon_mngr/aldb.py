@@ -1,6 +1,44 @@
 '''The base ALDB Objects'''
+import base64
+
 from insteon_mngr import BYTE_TO_HEX, BYTE_TO_ID
 
+# The sizes of the key and the record of each entry of a compact ALDB
+KEY_SIZE = 2
+RECORD_SIZE = 8
+
+
+def encode_records(records):
+    '''Returns records, a dict of raw records keyed by their 4 character hex
+    key, as a base64 string of fixed size key + record entries.  Returns
+    None if a key or record does not fit.'''
+    data = bytearray()
+    for key, raw in records.items():
+        if (len(key) != KEY_SIZE * 2 or key.upper() != key or
+                len(raw) != RECORD_SIZE):
+            return None
+        try:
+            data += bytes.fromhex(key)
+        except ValueError:
+            return None
+        data += raw
+    return base64.b64encode(data).decode()
+
+
+def decode_records(blob):
+    '''Returns a dict of the raw records in a compact ALDB keyed by their hex
+    key'''
+    ret = {}
+    data = bytearray(base64.b64decode(blob))
+    # Hex the whole blob once and slice the keys out of it
+    hex_data = data.hex().upper()
+    size = KEY_SIZE + RECORD_SIZE
+    for pos in range(0, len(data) - size + 1, size):
+        key = hex_data[pos * 2:(pos + KEY_SIZE) * 2]
+        # Slicing a bytearray copies the record into a new bytearray
+        ret[key] = data[pos + KEY_SIZE:pos + size]
+    return ret
+
 
 class ALDB(object):
     '''The base ALDB class which is inherited by both the Device and PLM
@@ -34,12 +72,32 @@ class ALDB(object):
             ret[key] = BYTE_TO_HEX(record.raw)
         return ret
 
+    def get_all_records_compact(self):
+        '''Returns the records as a base64 string, or None if they cannot be
+        stored that way'''
+        return encode_records(self.get_all_records())
+
     def load_aldb_records(self, records):
-        for key, record in records.items():
-            self.aldb[key] = ALDBRecord(self, bytearray.fromhex(record))
+        '''Loads records saved by either get_all_records_str or
+        get_all_records_compact'''
+        if isinstance(records, str):
+            for key, raw in decode_records(records).items():
+                self.aldb[key] = ALDBRecord(self, raw)
+        else:
+            for key, record in records.items():
+                self.aldb[key] = ALDBRecord(self, bytearray.fromhex(record))
+        self._changed()
 
     def clear_all_records(self):
         self.aldb = {}
+        self._changed()
+
+    def _changed(self, record=None):
+        '''Called whenever a record in this ALDB is changed, record is None
+        if more than one record may have changed'''
+        self.core.scene_map.mark_dirty(self)
+        self.core.router.aldb_changed(self._device)
+        self._device._state_changed('aldb', record)
 
     def get_matching_records(self, attributes):
         '''Returns an array of records that matches ALL attributes'''
@@ -125,6 +183,7 @@ class ALDBRecord(object):
     @raw.setter
     def raw(self, value):
         self._raw = value
+        self._database._changed(self)
 
     @property
     def link_sequence(self):
@@ -323,10 +382,12 @@ class ALDBRecord(object):
         return records
 
     def edit_record(self, record):
-        self.raw = record
+        if record != self._raw:
+            self.raw = record
 
     def edit_record_byte(self, byte_pos, byte):
         self.raw[byte_pos] = byte
+        self._database._changed(self)
 
     def json(self):
         '''Returns a dict to be used as a json reprentation of the link'''
@@ -22,7 +22,12 @@ class Common(object):
         as the object state.  Attribute excludes things like whether the object is a
         responder or is_deaf, these are features.'''
         if value is not None:
-            self._attributes[attr] = value
+            if (attr not in self._attributes or
+                    self._attributes[attr] != value or
+                    isinstance(value, (list, dict))):
+                # Lists and dicts may have been changed in place
+                self._attributes[attr] = value
+                self._state_changed('attributes')
         try:
             ret = self._attributes[attr]
         except KeyError:
@@ -33,6 +38,12 @@ class Common(object):
         ret = self._attributes.copy()
         return ret
 
+    def _state_changed(self, section=None):
+        '''Called whenever something that is saved in the config changes,
+        section is the part of the saved state which changed, one of
+        attributes, aldb, groups, user_links or devices'''
+        pass
+
     def get_features_and_attributes(self):
         ret = self.get_attributes()
         return ret
@@ -42,11 +53,12 @@ class Group(Common):
     '''The Group class for all groups.  Specialized functions should be done
     in the send_handler or functions.'''
     def __init__(self, device, **kwargs):
-        super().__init__(**kwargs)
         self._device = device
+        super().__init__(**kwargs)
         self._type = 'relay'
         self._update_callbacks = []
         self._delete_callbacks = []
+        self._callback_debounce = 0
 
     @property
     def type(self):
@@ -91,16 +103,25 @@ class Group(Common):
         except KeyError:
             print('This group doesn\'t know the state', state)
         else:
+            self.device.core.initializer.prioritize(self.device)
             self.device.queue_device_msg(msg)
 
     @property
     def state_age(self):
-        '''Returns the age in seconds of the state value.'''
-        return time.time() - self.attribute('state_time')
+        '''Returns the age in seconds of the state value, or None if the
+        state is not known.'''
+        ret = None
+        if self.attribute('state_time') is not None:
+            ret = time.time() - self.attribute('state_time')
+        return ret
 
     def _do_update_callback(self):
         for callback in self._update_callbacks:
-            callback()
+            self.device.core.callback_dispatcher.dispatch(
+                callback,
+                key=(self, callback),
+                debounce=self._callback_debounce
+            )
 
     @property
     def name(self):
@@ -196,10 +217,20 @@ class Group(Common):
             ret = True
         return ret
 
+    def _state_changed(self, section=None):
+        self._device._state_changed('groups')
+
     def add_update_callback(self, callback):
-        """Register as callback for when state is touched."""
+        """Register as callback for when state is touched.  Callbacks are
+        run on a worker thread, not the core thread."""
         self._update_callbacks.append(callback)
 
+    def set_callback_debounce(self, seconds):
+        """Delay update callbacks until the state of this group has not been
+        touched for this many seconds.  Defaults to 0, which only merges
+        updates that are still waiting to be run."""
+        self._callback_debounce = seconds
+
     def add_delete_callback(self, callback):
         """Register as callback for when this group is deleted."""
         self._delete_callbacks.append(callback)
@@ -277,6 +308,9 @@ class Root(Common):
     def root(self):
         return self
 
+    def _state_changed(self, section=None, record=None):
+        self._core.state_changed(self, section, record)
+
     @property
     def base_group_number(self):
         return self.attribute('base_group_number')
@@ -330,12 +364,24 @@ class Root(Common):
     def plm(self):
         return self._plm
 
+    @property
+    def is_awake(self):
+        '''Returns True if the device is currently listening for messages.
+        Only battery powered devices ever sleep.'''
+        return True
+
     ##################################
     # Private functions
     ##################################
 
     def _resend_msg(self, message):
         self.out_queue.insert(0, message)
+        self._msg_queued()
+
+    def _msg_queued(self):
+        '''Called after a message is added to the out_queue, so that the
+        modem looks at this device for messages to send'''
+        self.plm._queued_devices.add(self)
 
     def update_message_history(self, msg):
         # Remove old messages first
@@ -384,7 +430,7 @@ class Root(Common):
         '''Constructs a dictionary of the group attributes for saving to the
         config file
         Returns:None'''
-        ret = self._groups_config
+        ret = self._groups_config.copy()
         for group in self.get_all_groups():
             ret[group.group_number] = group._attributes.copy()
         return ret
@@ -405,6 +451,7 @@ class Root(Common):
 
     def queue_device_msg(self, message):
         self.out_queue.append(message)
+        self._msg_queued()
 
     def add_user_link(self, controller_group, data, uid):
         controller_id = controller_group.device.dev_addr_str
@@ -427,6 +474,7 @@ class Root(Common):
                 uid
             )
             self._user_links[new_user_link.uid] = new_user_link
+            self._state_changed('user_links')
 
     def get_all_user_links(self):
         return self._user_links.copy()
@@ -437,6 +485,8 @@ class Root(Common):
             del self._user_links[uid]
         except KeyError:
             ret = False
+        else:
+            self._state_changed('user_links')
         return ret
 
     def find_user_link(self, search_uid):
@@ -505,6 +555,14 @@ class Root(Common):
             ret = self._groups[search_num]
         return ret
 
+    def get_or_create_group(self, search_num):
+        '''Returns the group, creating it if this object creates groups on
+        demand.  Only used where the group must exist, such as when a link
+        or attribute is added to it.  Device groups are created by the
+        device class, so for devices this is the same as
+        get_object_by_group_num.'''
+        return self.get_object_by_group_num(search_num)
+
     def get_group_number_by_object(self, search_object):
         ret = None
         for key, value in self._groups.items():
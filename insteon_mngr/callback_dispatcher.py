@@ -0,0 +1,103 @@
+'''The CallbackDispatcher class, which runs user callbacks outside of the core
+thread.'''
+import collections
+import threading
+import time
+import traceback
+
+
+class CallbackDispatcher(object):
+    '''Runs callbacks on a small pool of worker threads so that slow user
+    callbacks do not delay the processing of messages on the core thread.
+
+    Events are held in a bounded queue.  An event dispatched with the same key
+    as an event which is still waiting replaces it, so a group that is touched
+    several times produces a single notification.  An optional debounce
+    delays an event until its key has not been touched for that many seconds.
+    When the queue is full the oldest event is dropped and counted.  The
+    workers run until stop is called or the main thread exits.'''
+    def __init__(self, workers=2, max_events=1000):
+        self._events = collections.OrderedDict()
+        self._running = set()
+        self._condition = threading.Condition()
+        self._max_events = max_events
+        self._dropped = 0
+        self._coalesced = 0
+        self._stopped = False
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def dropped(self):
+        '''The number of events dropped because the queue was full'''
+        return self._dropped
+
+    @property
+    def coalesced(self):
+        '''The number of events merged into an event which was waiting'''
+        return self._coalesced
+
+    def dispatch(self, function, key=None, debounce=0):
+        '''Queues function to be called by a worker thread.  Waiting events
+        with the same key are replaced by this event.  If debounce is set the
+        event will not be run until debounce seconds after the last event
+        with this key.'''
+        due = time.time() + debounce
+        with self._condition:
+            if key is None:
+                key = object()
+            if key in self._events:
+                self._events[key] = (function, due)
+                self._coalesced += 1
+            else:
+                if len(self._events) >= self._max_events:
+                    self._events.popitem(last=False)
+                    self._dropped += 1
+                self._events[key] = (function, due)
+            self._condition.notify()
+
+    def stop(self):
+        '''Stops the workers once they finish the callbacks they are running,
+        events which are still waiting are dropped'''
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _get_next_event(self):
+        '''Returns the key, function and wait time of the oldest event that
+        is due and whose key is not already running.'''
+        now = time.time()
+        wait = .5
+        for key, (function, due) in self._events.items():
+            if key in self._running:
+                continue
+            if due <= now:
+                return key, function, 0
+            wait = min(wait, due - now)
+        return None, None, wait
+
+    def _worker(self):
+        while threading.main_thread().is_alive():
+            with self._condition:
+                if self._stopped:
+                    return
+                key, function, wait = self._get_next_event()
+                if function is None:
+                    self._condition.wait(wait)
+                    continue
+                del self._events[key]
+                self._running.add(key)
+            try:
+                function()
+            except Exception:
+                print('error in callback')
+                traceback.print_exc()
+            with self._condition:
+                self._running.discard(key)
+                self._condition.notify()
@@ -0,0 +1,66 @@
+'''The ChannelEstimator class, which predicts when the powerline will be free
+of Insteon traffic.'''
+import time
+
+# Approximate airtime in seconds of a single hop of each message length
+HOP_TIME = {'standard': .05, 'extended': .109}
+# Quiet time left after the last hop before sending
+GAP_TIME = .005
+
+
+class ChannelEstimator(object):
+    '''Tracks the traffic heard on one powerline.  Every received frame will
+    be repeated once for each hop it has left, and an all-link broadcast is
+    followed by a cleanup and an ack for each responder.  Modems on the same
+    powerline share an estimator, so traffic heard by one holds back the
+    sends of the others.'''
+    def __init__(self):
+        self._busy_until = 0
+        self._frames = 0
+        self._holds = 0
+        self._held_time = 0
+        self._hold_start = None
+
+    @property
+    def busy_until(self):
+        '''The time at which the channel is expected to be idle'''
+        return self._busy_until
+
+    def frame_rcvd(self, msg_length, hops_left):
+        '''Called for every Insteon frame received by any modem on this
+        powerline, known device or not'''
+        self._frames += 1
+        hop_time = HOP_TIME.get(msg_length, HOP_TIME['standard'])
+        self._extend(time.time() + (hop_time * hops_left) + GAP_TIME)
+
+    def cleanups_expected(self, responders, max_hops):
+        '''Called when an all-link broadcast is heard. responders is the
+        number of devices which will be sent a cleanup.'''
+        hop_time = HOP_TIME['standard']
+        cleanup_time = responders * 2 * (max_hops + 1) * hop_time
+        self._extend(time.time() + cleanup_time + GAP_TIME)
+
+    def is_idle(self):
+        '''Returns True if nothing is expected on the channel.  Called before
+        each send, the time spent waiting is counted.'''
+        now = time.time()
+        ret = now >= self._busy_until
+        if ret and self._hold_start is not None:
+            self._held_time += now - self._hold_start
+            self._hold_start = None
+        elif not ret and self._hold_start is None:
+            self._hold_start = now
+            self._holds += 1
+        return ret
+
+    def get_stats(self):
+        '''Returns a dict of the frames heard and the number of times and
+        total seconds that sends were held for traffic'''
+        return {
+            'frames': self._frames,
+            'holds': self._holds,
+            'held_time': self._held_time
+        }
+
+    def _extend(self, busy_until):
+        self._busy_until = max(self._busy_until, busy_until)
@@ -1,7 +1,7 @@
 import threading
 import json
 import re
-import pkg_resources
+from importlib import resources
 
 from bottle import (route, run, Bottle, response, get, post, put, delete,
                     request, error, static_file, view, TEMPLATE_PATH,
@@ -12,8 +12,11 @@ from insteon_mngr.sequences import DeleteLinkPair
 
 core = None
 
-STATIC_PATH = pkg_resources.resource_filename(__name__, '/web/static')
-ROOT_PATH = pkg_resources.resource_filename(__name__, '/web')
+# Bottle needs real paths, setup.py marks the package as not zip safe so
+# that these always exist on disk
+ROOT_PATH = str(resources.files('insteon_mngr').joinpath('web'))
+STATIC_PATH = str(resources.files('insteon_mngr').joinpath('web')
+                  .joinpath('static'))
 
 def start(passed_core):
     global core      # pylint: disable=W0603
@@ -56,7 +59,7 @@ def modem_links(device_id, group_number):
 def api_modem_group_put(modem_id):
     modem = core.get_device_by_addr(modem_id)
     for group_number in request.json.keys():
-        group = modem.get_object_by_group_num(int(group_number))
+        group = modem.get_or_create_group(int(group_number))
         update_device_attributes(group, request.json[group_number])
     return jsonify(json_core())
 
@@ -78,7 +81,7 @@ def _delete_device(modem_id, device_id):
 @post('/modems/<:re:[A-Fa-f0-9]{6}>/devices/<device_id:re:[A-Fa-f0-9]{6}>/groups/<group_number:re:[0-9]{1,3}>/links/definedLinks.json')
 def add_defined_device_link(device_id, group_number):
     root = core.get_device_by_addr(device_id)
-    controller_group = root.get_object_by_group_num(int(group_number))
+    controller_group = root.get_or_create_group(int(group_number))
     # Be careful, no documentation guarantees that data_3 is always the group
     responder_id = request.json['responder_id']
     responder_device = core.get_device_by_addr(responder_id)
@@ -91,7 +94,7 @@ def add_defined_device_link(device_id, group_number):
 @route('/modems/<:re:[A-Fa-f0-9]{6}>/devices/<device_id:re:[A-Fa-f0-9]{6}>/groups/<group_number:re:[0-9]{1,3}>/links/definedLinks/<uid:re:[0-9]{6}>.json', method='PATCH')
 def edit_defined_device_link(device_id, group_number, uid):
     controller_root = core.get_device_by_addr(device_id)
-    controller = controller_root.get_object_by_group_num(int(group_number))
+    controller = controller_root.get_or_create_group(int(group_number))
     user_link = core.find_user_link(int(uid))
     if user_link is not None:
         user_link.edit(controller, request.json)
@@ -179,7 +182,9 @@ def modem_group_page():
 
 @get('/modems/<modem_id:re:[A-Fa-f0-9]{6}>/devices/<device_id:re:[A-Fa-f0-9]{6}/?>')
 def device_page(modem_id, device_id):
-    group_number = core.get_device_by_addr(device_id).base_group_number
+    device = core.get_device_by_addr(device_id)
+    core.initializer.prioritize(device)
+    group_number = device.base_group_number
     redirect('/modems/' + modem_id + '/devices/' + device_id +'/groups/' + str(group_number))
 
 @get('/modems/<:re:[A-Fa-f0-9]{6}/devices/[A-Fa-f0-9]{6}/groups/[0-9]{1,3}/?>')
@@ -237,13 +242,18 @@ def json_core():
 def json_links(device_id, group_number):
     ret = {}
     controller_device = core.get_device_by_addr(device_id)
+    core.initializer.prioritize(controller_device)
     controller_group = controller_device.get_object_by_group_num(group_number)
-    links = controller_group.get_relevant_links()
-    ret['definedLinks'] = _user_link_output(controller_group)
+    ret['definedLinks'] = {}
     ret['undefinedLinks'] = {}
     ret['unknownLinks'] = {}
     ret['bad_links'] = {}
     ret['modemLinks'] = {}
+    if controller_group is None:
+        # A modem group which has not been used yet has no links
+        return ret
+    links = controller_group.get_relevant_links()
+    ret['definedLinks'] = _user_link_output(controller_group)
     if controller_group.group_number == controller_device.base_group_number:
         for link in controller_device.get_bad_links():
             ret['bad_links'].update(link.json())
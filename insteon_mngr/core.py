@@ -1,45 +1,80 @@
-import json
 import time
 import atexit
 import threading
 import random
 import os
-import pkg_resources
 
-from insteon_mngr.plm import PLM
-from insteon_mngr.hub import Hub
-from insteon_mngr.config_server import start, stop
+from insteon_mngr.callback_dispatcher import CallbackDispatcher
+from insteon_mngr.channel import ChannelEstimator
+from insteon_mngr.router import Router
+from insteon_mngr.persistence import JSONStore
 from insteon_mngr.base_objects import Group
 from insteon_mngr.devices import DimmerGroup
+from insteon_mngr.devices.catalog import get_catalog
+from insteon_mngr.scene_map import SceneMap
+from insteon_mngr.state_refresher import StateRefresher
+from insteon_mngr.initializer import DeviceInitializer
 
 
 class Insteon_Core(object):
-    '''Provides global management functions'''
+    '''Provides global management functions
 
-    def __init__(self, config_path=None):
+    storage is 'json' to save the state to config.json, or 'sqlite' to save
+    it to config.db, which is created from config.json if it does not exist.
+    With sqlite, lazy_load=True loads each device when it is first used
+    rather than at startup.  With json, compact_aldb=True saves each ALDB as
+    a single base64 string, either form is read.  With json, journal=True
+    appends each change to a journal as it happens and writes config.json
+    less often.
+
+    The web interface is started unless web_server is False.  The modem
+    transports, the web server and the device data are only imported when
+    they are first used, so a headless core does not load bottle, requests
+    or serial unless it needs them.'''
+
+    def __init__(self, config_path=None, storage='json', lazy_load=False,
+                 compact_aldb=False, web_server=True, journal=False):
         if config_path is None:
             os.makedirs(os.path.join(os.path.expanduser("~"),'.insteon_mngr'),
                         exist_ok=True)
-            self._config_path = os.path.join(os.path.expanduser("~"),
-                                             '.insteon_mngr',
-                                             'config.json')
-        else:
-            self._config_path = os.path.join(config_path, 'config.json')
+            config_path = os.path.join(os.path.expanduser("~"),
+                                       '.insteon_mngr')
+        self._config_path = os.path.join(config_path, 'config.json')
         self._modems = []
+        self._channels = {}
+        self.router = Router(self)
+        self.callback_dispatcher = CallbackDispatcher()
+        self.scene_map = SceneMap()
+        self.state_refresher = StateRefresher(self)
+        self.initializer = DeviceInitializer(self)
         self._group_callbacks = []
-        self._last_saved_time = 0
+        self._web_server = web_server
+        if storage == 'sqlite':
+            from insteon_mngr.sqlite_store import SQLiteStore, migrate_json
+            db_path = os.path.join(config_path, 'config.db')
+            if (not os.path.exists(db_path) and
+                    os.path.exists(self._config_path)):
+                migrate_json(self._config_path, db_path)
+            self.store = SQLiteStore(db_path, lazy=lazy_load)
+        else:
+            self.store = JSONStore(self._config_path, journal=journal,
+                                   compact_aldb=compact_aldb)
         self._load_state()
         self._exit = False
-        threading.Thread(target=self._core_loop).start()
+        self._thread = threading.Thread(target=self._core_loop)
+        self._thread.start()
         # Be sure to save before exiting
         atexit.register(self._save_state, True)
 
-        # Load device data
-        json_cats = pkg_resources.resource_string(__name__, "/data/device_categories.json")
-        self.device_categories = json.loads(json_cats.decode())
+    @property
+    def device_categories(self):
+        '''The device categories, from the catalog shared by all cores'''
+        return get_catalog().categories
 
-        json_models = pkg_resources.resource_string(__name__, "/data/device_models.json")
-        self.device_models = json.loads(json_models.decode())
+    @property
+    def device_models(self):
+        '''The device models, from the catalog shared by all cores'''
+        return get_catalog().models
 
     def _get_all_user_links(self):
         ret = {}
@@ -91,11 +126,16 @@ class Insteon_Core(object):
         return ret
 
     def _core_loop(self):
-        server = start(self)
+        server = None
+        if self._web_server:
+            from insteon_mngr.config_server import start
+            server = start(self)
         while threading.main_thread().is_alive() and self._exit is False:
             self._loop_once()
             time.sleep(.05)
-        stop(server)
+        if server is not None:
+            from insteon_mngr.config_server import stop
+            stop(server)
 
     def _loop_once(self):
         '''Perform one loop of processing the data waiting to be
@@ -104,65 +144,56 @@ class Insteon_Core(object):
             modem.process_input()
             modem.process_unacked_msg()
             modem.process_queue()
+        self.state_refresher.process()
+        self.initializer.process()
         self._save_state()
 
-    def _save_device(self, device):
-        ret = device._attributes.copy()
-        ret['aldb'] = device.aldb.get_all_records_str()
-        ret['groups'] = device.save_groups()
-        ret['user_links'] = device.save_user_links()
-        return ret
+    def state_changed(self, root, section=None, record=None):
+        '''Called by a device or modem when anything saved in the config
+        changes, record is the ALDB record if only one record changed'''
+        self.store.mark_dirty(root, section, record)
+
+    def get_init_progress(self):
+        '''Returns a dict of the progress of the background initialization
+        of the devices'''
+        return self.initializer.get_progress()
+
+    def get_save_stats(self):
+        '''Returns a dict of the number of saves, the time taken and the
+        bytes written'''
+        return self.store.get_stats()
 
     def _save_state(self, is_exit=False):
-        # Saves the config of the entire core to a file
-        if self._last_saved_time < time.time() - 60 or is_exit:
-            # Save once a minute, on on exit
-            out_data = {'modems': {}}
-            for modem in self._modems:
-                out_data['modems'][modem.dev_addr_str] = self._save_device(modem)
-                out_data['modems'][modem.dev_addr_str]['devices'] = {}
-                for address, device in modem._devices.items():
-                    out_data['modems'][modem.dev_addr_str]['devices'][address] = \
-                        self._save_device(device)
-            try:
-                json_string = json.dumps(out_data,
-                                         sort_keys=True,
-                                         indent=4,
-                                         ensure_ascii=False)
-            except Exception:
-                print('error writing config to file')
-            else:
-                outfile = open(self._config_path, 'w')
-                outfile.write(json_string)
-                outfile.close()
-            self._saved_state = out_data
-            self._last_saved_time = time.time()
+        # Saves once a minute if anything changed, or on exit
+        self.store.save(self._modems, is_exit)
 
     def _load_state(self):
-        try:
-            with open(self._config_path, 'r') as infile:
-                read_data = infile.read()
-            read_data = json.loads(read_data)
-        except FileNotFoundError:
-            read_data = {}
-        except ValueError:
-            read_data = {}
-            print('unable to read config file, skipping')
+        read_data = self.store.load()
         if 'modems' in read_data:
             for modem_id, modem_data in read_data['modems'].items():
                 if modem_data['type'] == 'plm':
                     self.add_plm(attributes=modem_data, device_id=modem_id)
                 elif modem_data['type'] == 'hub':
                     self.add_hub(attributes=modem_data, device_id=modem_id)
+                elif modem_data['type'] == 'hub_socket':
+                    self.add_hub_socket(attributes=modem_data,
+                                        device_id=modem_id)
+        # Everything loaded matches the file
+        self.store.mark_all_clean()
 
     def do_group_callback(self, group):
         '''Causes the group callback to be called. Likely should only be done,
-        by the group object.'''
+        by the group object.  The callbacks are run on a worker thread.'''
+        data = {group.type: [{
+            'device': group.device.dev_addr_str,
+            'group_number': group.group_number
+        }]}
         for callback in self._group_callbacks:
-            callback({group.type: [{
-                'device': group.device.dev_addr_str,
-                'group_number': group.group_number
-            }]})
+            self.callback_dispatcher.dispatch(
+                lambda callback=callback: callback(data),
+                key=('group', group.device.dev_addr_str, group.group_number,
+                     callback)
+            )
 
     ###################################################################
     #
@@ -195,14 +226,33 @@ class Insteon_Core(object):
                 ret = modem
                 break
         if ret is None:
+            from insteon_mngr.hub import Hub
             ret = Hub(self, **kwargs)
             if ret is not None:
                 self._modems.append(ret)
         return ret
 
+    def add_hub_socket(self, **kwargs):
+        '''Inform the core of a hub that should be monitored through its raw
+        serial passthrough port, rather than by polling over http'''
+        ret = None
+        if 'attributes' not in kwargs:
+            for modem in self._modems:
+                if (modem.type == 'hub_socket' and
+                        modem.ip == kwargs['ip'] and
+                        modem.port == kwargs.get('port', modem.port)):
+                    ret = modem
+                    break
+        if ret is None:
+            from insteon_mngr.hub_socket import HubSocket
+            ret = HubSocket(self, **kwargs)
+            self._modems.append(ret)
+        return ret
+
     def add_plm(self, **kwargs):
         '''Inform the core of a plm that should be monitored as part
         of the core process'''
+        from insteon_mngr.plm import PLM
         device_id = ''
         ret = None
         # TODO the check for an existing PLM is a bit clunky, need to check /
@@ -230,6 +280,7 @@ class Insteon_Core(object):
         for modem in self._modems:
             if addr.lower() == modem.dev_addr_str.lower():
                 ret = modem
+                break
             else:
                 ret = modem.get_device_by_addr(addr)
                 if ret is not None:
@@ -239,6 +290,15 @@ class Insteon_Core(object):
             pass
         return ret
 
+    def get_channel(self, powerline=None):
+        '''Returns the ChannelEstimator for the named powerline.  Modems
+        without a powerline attribute share the default channel.'''
+        if powerline is None:
+            powerline = 'default'
+        if powerline not in self._channels:
+            self._channels[powerline] = ChannelEstimator()
+        return self._channels[powerline]
+
     def get_all_modems(self):
         ret = []
         for plm in self._modems:
@@ -246,9 +306,18 @@ class Insteon_Core(object):
         return ret
 
     def close(self, *kwargs):
-        '''Shutdown the core loop thread.'''
+        '''Stops the core loop and the threads of the modems, the callback
+        dispatcher and the store, then saves the state.'''
         self._exit = True
-        self._save_state
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        # Saved here instead
+        atexit.unregister(self._save_state)
+        for modem in self._modems:
+            modem.close()
+        self.callback_dispatcher.stop()
+        self._save_state(True)
+        self.store.close()
 
     def add_group_callback(self, callback):
         '''Registers a function to be called when a group is added to any
@@ -0,0 +1,100 @@
+'''The DeviceCatalog class, which describes each device by its dev_cat and
+sub_cat, read from device_categories.json and device_models.json the first
+time it is needed and shared by every core.'''
+import json
+import threading
+
+from insteon_mngr.base_objects import Group
+from insteon_mngr.devices.generic_rcvd import GenericRcvdHandler
+from insteon_mngr.devices.generic_send import GenericSendHandler
+from insteon_mngr.devices.generic_functions import GenericFunctions
+from insteon_mngr.devices.dimmer import (DimmerSendHandler, DimmerGroup,
+                                         DimmerFunctions)
+
+# The handler classes and group class of each category type, types not
+# listed use DEFAULT_CLASSES
+CATEGORY_CLASSES = {
+    'dimmer': {
+        'device': {
+            'functions': DimmerFunctions,
+            'send_handler': DimmerSendHandler,
+            'rcvd_handler': GenericRcvdHandler
+        },
+        'group': DimmerGroup
+    },
+    'bridge': {
+        'device': {
+            'functions': None,
+            'send_handler': None,
+            'rcvd_handler': None
+        },
+        'group': Group
+    }
+}
+DEFAULT_CLASSES = {
+    'device': {
+        'functions': GenericFunctions,
+        'send_handler': GenericSendHandler,
+        'rcvd_handler': GenericRcvdHandler
+    },
+    'group': Group
+}
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    '''Returns the catalog, which is read the first time this is called'''
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = DeviceCatalog(_load_data('device_categories.json'),
+                                         _load_data('device_models.json'))
+    return _catalog
+
+
+def _load_data(name):
+    from importlib import resources
+    data = resources.files('insteon_mngr').joinpath('data').joinpath(name)
+    return json.loads(data.read_text())
+
+
+class DeviceCatalog(object):
+    '''Holds the device categories and models as read from the data files,
+    and an entry for each (dev_cat, sub_cat) giving its category, model and
+    the classes used for it.  Entries are built once and shared, they must
+    not be changed.'''
+    def __init__(self, categories, models):
+        self.categories = categories
+        self.models = models
+        self._categories = {}
+        for key, category in categories.items():
+            self._categories[int(key, 16)] = category
+        self._models = {}
+        for key, model in models.items():
+            # A few keys use another separator than ':'
+            self._models[(int(key[:2], 16), int(key[3:], 16))] = model
+        self._entries = {}
+
+    def get_entry(self, dev_cat, sub_cat):
+        '''Returns a dict of the category and model of the device, None if
+        unknown, and the functions, send_handler and rcvd_handler classes
+        under 'device' and the group class under 'group'.'''
+        key = (dev_cat, sub_cat)
+        ret = self._entries.get(key)
+        if ret is None:
+            category = self._categories.get(dev_cat)
+            classes = DEFAULT_CLASSES
+            if category is not None:
+                classes = CATEGORY_CLASSES.get(category['type'],
+                                               DEFAULT_CLASSES)
+            ret = {
+                'category': category,
+                'model': self._models.get(key),
+                'device': classes['device'],
+                'group': classes['group']
+            }
+            self._entries[key] = ret
+        return ret
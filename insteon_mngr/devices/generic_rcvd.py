@@ -192,24 +192,23 @@ class GenericRcvdHandler(object):
     def _process_alllink_cleanup_ack(self, msg):
         self._device.remove_cleanup_msgs(msg)
         self._alllink_state_update(msg)
+        modem = self._device.core.router.get_sending_modem(msg)
+        modem.scene_responder_acked(self._device,
+                                    msg.get_byte_by_name('cmd_2'))
         if self._was_alllink_cleanup_requested(msg):
             self._device.last_sent_msg.insteon_msg.device_ack = True
 
     def _alllink_state_update(self, msg):
-        records = self._device.aldb.get_matching_records({
-            'controller': False,
-            'group': msg.get_byte_by_name('cmd_2'),
-            'dev_addr_hi': msg.get_byte_by_name('to_addr_hi'),
-            'dev_addr_mid': msg.get_byte_by_name('to_addr_mid'),
-            'dev_addr_low': msg.get_byte_by_name('to_addr_low'),
-            'in_use': True
-        })
-        for record in records:
-            parsed_record = record.parse_record()
+        members = self._device.core.scene_map.get_members(
+            msg.insteon_msg.to_addr_str,
+            msg.get_byte_by_name('cmd_2'))
+        for member in members:
+            if member['device'] is not self._device:
+                continue
             state = 0x00  # Off always results in an off state???
             if msg.get_byte_by_name('cmd_1') == 0x11:
-                state = parsed_record['data_1']
-            obj = self._device.get_object_by_group_num(parsed_record['data_3'])
+                state = member['on_level']
+            obj = self._device.get_object_by_group_num(member['group_number'])
             if obj is not None:
                 obj.set_cached_state(state)
 
@@ -352,15 +351,13 @@ class GenericRcvdHandler(object):
         self._update_linked(group, is_on)
 
     def _update_linked(self, group, is_on):
-        controller_records = self._device.aldb.get_matching_records({
-            'controller': True,
-            'group': group,
-            'in_use': True
-        })
-        for controller in controller_records:
-            responder_records = controller.get_reciprocal_records()
-            for responder in responder_records:
-                state = 0x00  # Off always results in an off state???
-                if is_on:
-                    state = responder.parse_record()['data_1']
-                responder.device.set_cached_state(state)
+        members = self._device.core.scene_map.get_members(
+            self._device.dev_addr_str, group)
+        for member in members:
+            state = 0x00  # Off always results in an off state???
+            if is_on:
+                state = member['on_level']
+            obj = member['device'].get_object_by_group_num(
+                member['group_number'])
+            if obj is not None:
+                obj.set_cached_state(state)
@@ -1,8 +1,8 @@
 from insteon_mngr.plm_message import PLM_Message
 from insteon_mngr.base_objects import BaseSendHandler
 from insteon_mngr.sequences import (ScanDeviceALDBi1, ScanDeviceALDBi2,
-    StatusRequest, AddPLMtoDevice, InitializeDevice, WriteALDBRecordi2,
-    WriteALDBRecordi1)
+    VerifyDeviceALDBi2, StatusRequest, AddPLMtoDevice, InitializeDevice,
+    WriteALDBRecordi2, WriteALDBRecordi1)
 
 
 class GenericSendHandler(BaseSendHandler):
@@ -46,8 +46,10 @@ class GenericSendHandler(BaseSendHandler):
     #
     #################################################################
 
-    def get_status(self):
+    def get_status(self, success=None, failure=None):
         status_sequence = StatusRequest(group=self._device.base_group)
+        status_sequence.add_success_callback(success)
+        status_sequence.add_failure_callback(failure)
         status_sequence.start()
 
     def get_engine_version(self):
@@ -65,6 +67,20 @@ class GenericSendHandler(BaseSendHandler):
         scan_object.add_failure_callback(failure)
         scan_object.start()
 
+    def verify_aldb(self, changes=None, success=None, failure=None):
+        '''Brings the cached aldb up to date after the aldb_delta changed,
+        changes is the number of writes the delta moved by'''
+        if (self._device.attribute('engine_version') == 0 or
+                len(self._device.aldb.aldb) == 0):
+            # i1 records are peeked a byte at a time, just rescan
+            self.query_aldb(success=success, failure=failure)
+        else:
+            scan_object = VerifyDeviceALDBi2(device=self._device,
+                                             changes=changes)
+            scan_object.add_success_callback(success)
+            scan_object.add_failure_callback(failure)
+            scan_object.start()
+
     def send_all_link_clean(self, group, cmd):
         if cmd == 0x11:
             message = self.create_message('cleanup_on')
@@ -85,9 +101,11 @@ class GenericSendHandler(BaseSendHandler):
     # ALDB commands
     ######################
 
-    def i2_get_aldb(self, dev_bytes,):
+    def i2_get_aldb(self, dev_bytes, failure=None):
         message = self.create_message('read_aldb')
         message.insert_bytes_into_raw(dev_bytes)
+        if failure is not None:
+            message.msg_failure_callback = failure
         self._device.queue_device_msg(message)
 
     def delete_record(self, key=None):
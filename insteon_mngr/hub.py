@@ -1,102 +1,170 @@
-import xml.etree.ElementTree as ET
+import base64
+import string
 import time
 import threading
 import queue
 
-import requests
-
 from insteon_mngr import BYTE_TO_HEX
 from insteon_mngr.plm import Modem
 
+# Seconds between polls of the hub buffer while waiting for an ack
+POLL_FAST = .2
+# The longest time between polls when nothing is happening
+POLL_IDLE = 2.0
+# The factor by which the time between polls grows on each idle poll
+POLL_BACKOFF = 1.25
 
-def hub_thread(hub):
-    prev_end_pos = -1
-    last_bytestring = ''
 
-    while threading.main_thread().is_alive():
-        # Read First
-        bytestring = ''
-        current_end_pos = 0
-        start_time = time.time()
+# The number of hex characters in the hub's ring buffer
+RING_LENGTH = 200
+# The least number of seconds between warnings that the ring overflowed
+OVERFLOW_WARNING_INTERVAL = 60
 
-        # Get Buffer Contents
-        try:
-            response = requests.get('http://' + hub.ip + ':' +
-                                    hub.port + '/buffstatus.xml',
-                                    auth=requests.auth.HTTPBasicAuth(
-                                        hub.user,
-                                        hub.password),
-                                    timeout=5)
-        except requests.exceptions.Timeout:
-            # TODO handle multiple timeouts, close connection or something
-            print('-----------Timeout Occurred--------')
+
+class HubBufferReader(object):
+    '''Follows the hub's 200 character ring buffer between polls.  The
+    position of the end pointer is tracked exactly, and the part of the ring
+    which should not have been written since the last poll is compared with
+    the previous snapshot.  If it differs the ring wrapped past the last
+    read position, the entire ring is then treated as new and the loss is
+    counted.'''
+    def __init__(self):
+        self._ring = None
+        self._end_pos = 0
+        self._overflows = 0
+        self._last_warning = 0
+        self._bad_responses = 0
+        self._bytes_read = 0
+
+    @property
+    def overflows(self):
+        '''The number of times the ring wrapped between polls, in which
+        case messages were lost'''
+        return self._overflows
+
+    @property
+    def bad_responses(self):
+        '''The number of responses which did not contain a valid buffer'''
+        return self._bad_responses
+
+    @property
+    def bytes_read(self):
+        return self._bytes_read
+
+    def reset(self):
+        '''Called after a command is sent, the hub clears its buffer'''
+        self._ring = '0' * RING_LENGTH
+        self._end_pos = 0
+
+    def read(self, text):
+        '''Parses the text of buffstatus.xml. Returns a bytearray of the
+        bytes added since the last read, which may be empty, or None if the
+        text did not contain a valid buffer'''
+        payload = self._parse(text)
+        if payload is None:
+            self._bad_responses += 1
+            return None
+        ring = payload[:RING_LENGTH]
+        end_pos = int(payload[RING_LENGTH:], 16)
+        if self._ring is None:
+            # First read, everything in the buffer is old
+            hex_string = ''
+        elif end_pos == self._end_pos:
+            hex_string = ''
+            if ring != self._ring:
+                # Wrapped all the way around to the same position
+                hex_string = self._slice(ring, end_pos, end_pos)
+                self._overflowed()
+        elif (self._slice(ring, end_pos, self._end_pos) !=
+              self._slice(self._ring, end_pos, self._end_pos)):
+            hex_string = self._slice(ring, end_pos, end_pos)
+            self._overflowed()
+        else:
+            hex_string = self._slice(ring, self._end_pos, end_pos)
+        self._ring = ring
+        self._end_pos = end_pos
+        ret = bytearray.fromhex(hex_string)
+        self._bytes_read += len(ret)
+        return ret
+
+    def _overflowed(self):
+        self._overflows += 1
+        # A busy network can overflow on every poll, the counter keeps the
+        # total
+        now = time.time()
+        if now > self._last_warning + OVERFLOW_WARNING_INTERVAL:
+            self._last_warning = now
+            print('warning, hub buffer overflowed, messages may have been',
+                  'lost,', self._overflows, 'overflows so far')
+
+    def _parse(self, text):
+        # Avoids building an xml tree for a single element
+        ret = None
+        start = text.find('<BS>')
+        end = text.find('</BS>', start)
+        if start >= 0 and end >= 0:
+            payload = text[start + 4:end].strip()
+            if (len(payload) == RING_LENGTH + 2 and
+                    self._is_hex(payload) and
+                    int(payload[RING_LENGTH:], 16) < RING_LENGTH):
+                ret = payload
+        return ret
+
+    def _is_hex(self, payload):
+        # int() would also accept underscores and a 0x prefix
+        return all(char in string.hexdigits for char in payload)
+
+    def _slice(self, ring, start, end):
+        # The characters from start up to end, wrapping around the end of
+        # the ring.  If start and end are equal the whole ring is returned.
+        if start < end:
+            ret = ring[start:end]
+        else:
+            ret = ring[start:] + ring[:end]
+        return ret
+
+
+def hub_thread(hub):
+    while threading.main_thread().is_alive() and not hub._closed:
+        start_time = time.time()
+        with hub._buffer_lock:
+            buffer_changed = hub._poll_buffer()
+        if buffer_changed is None:
             time.sleep(.1)
             continue
 
-        root = ET.fromstring(response.text)
-        for response in root:
-            if response.tag == 'BS':
-                bytestring = response.text
-                break
-
-        # Place buffer in sequential order
-        current_end_pos = int(bytestring[-2:], 16)
-        bytestring = bytestring[current_end_pos:-2] + \
-            bytestring[:current_end_pos]
-
-        if last_bytestring != '' and prev_end_pos >= 0:
-            new_length = current_end_pos - prev_end_pos
-            new_length = (200 + new_length) if new_length < 0 else new_length
-            verify_bytestring = bytestring[190 - new_length: 200 - new_length]
-            if new_length > 0 and last_bytestring == verify_bytestring:
-                # print(bytestring[-new_length:])
-                hex_string = bytestring[-new_length:]
-                hex_data = bytearray.fromhex(hex_string)
-                hub._read_queue.put(bytearray(hex_data))
-
-        last_bytestring = bytestring[-10:]
-        prev_end_pos = current_end_pos
-
-        # Now write
-        if not hub._write_queue.empty():
-            command = hub._write_queue.get()
-            cmd_str = BYTE_TO_HEX(command)
-            url = ('http://' + hub.ip + ':' +
-                   hub.port + '/3?' + cmd_str + '=I=3')
-            try:
-                response = requests.get(url,
-                                        auth=requests.auth.HTTPBasicAuth(
-                                            hub.user,
-                                            hub.password),
-                                        timeout=3
-                                        )
-            except requests.exceptions.Timeout:
-                # TODO what should happen here, assume it wasn't received?
-                # but need to take into account that it was
-                print('-----------Timeout In Sending--------')
-                time.sleep(.1)
-                continue
-            last_bytestring = '0000000000'
-            prev_end_pos = 0
-
-        # Only hammering at hub server three times per second.  Seems to result
-        # in the PLM ACK and device message arriving together, but no more than
-        # that. Could consider slowing down, but waiting too long could cause
-        # the buffer to overflow and would slow down our responses.  Would also
-        # need to increase the hub ack_time accordingly too.
-        sleep_time = (start_time + .5) - time.time()
+        # Poll quickly while we are waiting on the hub, backing off when
+        # nothing is happening.  A write wakes the thread immediately.
+        interval = hub._update_poll_interval(buffer_changed)
+        sleep_time = (start_time + interval) - time.time()
         if sleep_time > 0:
-            time.sleep(sleep_time)
+            hub._poll_now.wait(sleep_time)
+            hub._poll_now.clear()
         elif sleep_time < -2:
             seconds = str(round(abs(sleep_time), 2))
             print('warning, hub took', seconds, 'to respond')
+        if interval == POLL_FAST:
+            hub._record_poll_period(time.time() - start_time)
+
+
+def hub_write_thread(hub):
+    while threading.main_thread().is_alive() and not hub._closed:
+        try:
+            command = hub._write_queue.get(timeout=.5)
+        except queue.Empty:
+            continue
+        with hub._buffer_lock:
+            hub._send_command(command)
+        # Look for the ack right away
+        hub._poll_now.set()
 
 
 class Hub(Modem):
 
     def __init__(self, core, **kwargs):
         super().__init__(core, **kwargs)
-        self.set_ack_time(3000)
+        # The ack time is derived from the poll cadence, this is the minimum
+        self.set_ack_time(500)
         self.attribute('type', 'hub')
         self.user = kwargs.get('user')
         self.password = kwargs.get('password')
@@ -104,7 +172,22 @@ class Hub(Modem):
         self.port = kwargs.get('port')
         self._read_queue = queue.Queue()
         self._write_queue = queue.Queue()
-        threading.Thread(target=hub_thread, args=[self]).start()
+        self._session = None
+        # False from a failed request until the next one succeeds
+        self._reachable = True
+        self._latency = {}
+        self._poll_interval = POLL_FAST
+        self._poll_period = POLL_FAST
+        self._poll_now = threading.Event()
+        self._buffer_reader = HubBufferReader()
+        # Held while reading the hub buffer or sending a command
+        self._buffer_lock = threading.Lock()
+        self._closed = False
+        self._threads = [threading.Thread(target=hub_thread, args=[self]),
+                         threading.Thread(target=hub_write_thread,
+                                          args=[self])]
+        for thread in self._threads:
+            thread.start()
         self._setup()
 
     @property
@@ -143,9 +226,151 @@ class Hub(Modem):
         self.attribute('password', value)
         return self.attribute('password')
 
+    def get_latency(self):
+        '''Returns a dict of the request latency in seconds for each hub
+        endpoint, containing the count, average, max and last values'''
+        ret = {}
+        for endpoint, stats in self._latency.items():
+            ret[endpoint] = stats.copy()
+            ret[endpoint]['average'] = stats['total'] / stats['count']
+        return ret
+
+    @property
+    def buffer_reader(self):
+        '''The HubBufferReader, which counts overflows of the hub buffer'''
+        return self._buffer_reader
+
+    @property
+    def poll_interval(self):
+        '''The current number of seconds between polls of the hub buffer'''
+        return self._poll_interval
+
+    def _update_poll_interval(self, buffer_changed):
+        '''Called by the hub thread after each poll.  Returns the seconds to
+        wait until the next poll.'''
+        if buffer_changed or self._is_ack_pending():
+            self._poll_interval = POLL_FAST
+        else:
+            self._poll_interval = min(self._poll_interval * POLL_BACKOFF,
+                                      POLL_IDLE)
+        return self._poll_interval
+
+    def _record_poll_period(self, seconds):
+        # Moving average of the actual time taken by each fast poll
+        self._poll_period = (self._poll_period * .75) + (seconds * .25)
+
+    def _get_latency_average(self, endpoint, default):
+        ret = default
+        stats = self._latency.get(endpoint)
+        if stats is not None:
+            ret = stats['total'] / stats['count']
+        return ret
+
+    def _get_ack_time(self):
+        # The command waits for any poll in progress, then the buffer is
+        # polled once more before the command is sent.  The ack is written
+        # to the buffer after the command request returns and can take up
+        # to two fast polls to be seen.
+        seconds = ((2 * self._poll_period) +
+                   (2 * self._get_latency_average('buffstatus', .5)) +
+                   self._get_latency_average('command', .5))
+        return max(self.ack_time, seconds * 1000)
+
+    def _get_transport_delay(self):
+        # A device message can arrive just after a poll
+        return self._poll_period + self._get_latency_average('buffstatus', .5)
+
+    def close(self):
+        self._closed = True
+        self._poll_now.set()
+        for thread in self._threads:
+            thread.join()
+        self._close_session()
+
+    def _new_session(self):
+        '''Creates a keep-alive session with the auth header prebuilt, so
+        that each request reuses the same connection to the hub'''
+        import requests
+        credentials = (str(self.user) + ':' + str(self.password)).encode()
+        session = requests.Session()
+        session.headers['Authorization'] = \
+            'Basic ' + base64.b64encode(credentials).decode()
+        self._base_url = 'http://' + str(self.ip) + ':' + str(self.port)
+        return session
+
+    def _close_session(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _request(self, endpoint, path, timeout):
+        '''Sends a request to the hub on the persistent session. Returns the
+        response or None on an error, in which case the session is closed
+        and a new connection is made on the next request'''
+        import requests
+        if self._session is None:
+            self._session = self._new_session()
+        start_time = time.time()
+        try:
+            response = self._session.get(self._base_url + path,
+                                         timeout=timeout)
+        except requests.exceptions.Timeout:
+            print('-----------Timeout Occurred on', endpoint, '--------')
+            self._close_session()
+            self._reachable = False
+            return None
+        except requests.exceptions.RequestException as err:
+            print('error connecting to hub on', endpoint, err)
+            self._close_session()
+            self._reachable = False
+            return None
+        self._reachable = True
+        self._record_latency(endpoint, time.time() - start_time)
+        return response
+
+    def _is_port_ready(self):
+        return self._reachable
+
+    def _record_latency(self, endpoint, seconds):
+        if endpoint not in self._latency:
+            self._latency[endpoint] = {'count': 0, 'total': 0, 'max': 0,
+                                       'last': 0}
+        stats = self._latency[endpoint]
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        stats['last'] = seconds
+
+    def _poll_buffer(self):
+        '''Reads the hub buffer and queues any new bytes.  Returns True if
+        there were new bytes, False if not and None on an error.  The caller
+        must hold the buffer lock.'''
+        response = self._request('buffstatus', '/buffstatus.xml', 5)
+        if response is None:
+            return None
+        new_bytes = self._buffer_reader.read(response.text)
+        if new_bytes:
+            self._read_queue.put(new_bytes)
+        return bool(new_bytes)
+
+    def _send_command(self, command):
+        '''Collects anything left in the hub buffer and then sends the
+        command, the hub clears its buffer when it accepts the command.  The
+        caller must hold the buffer lock.'''
+        self._poll_buffer()
+        response = self._request('command',
+                                 '/3?' + BYTE_TO_HEX(command) + '=I=3', 3)
+        if response is None:
+            # The message will be resent when its ack times out
+            print('error sending command to hub')
+        else:
+            # The hub clears its buffer when it accepts a command
+            self._buffer_reader.reset()
+
     def _read_from_port(self):
         if not self._read_queue.empty():
             self._read_buffer.extend(self._read_queue.get())
 
     def _write_to_port(self, msg):
         self._write_queue.put(msg)
+        self._poll_interval = POLL_FAST
@@ -0,0 +1,49 @@
+from insteon_mngr.modem import Modem
+from insteon_mngr.socket_transport import TCPTransport
+
+# The raw TCP port on which the hub passes through the PLM serial stream
+DEFAULT_PORT = 9761
+
+
+class HubSocket(Modem):
+    '''A hub reached through its serial passthrough port.  Unlike the Hub
+    class the buffer is not polled over http, bytes are streamed over a TCP
+    socket just as they would be read from a PLM.'''
+
+    def __init__(self, core, **kwargs):
+        super().__init__(core, **kwargs)
+        # Allow for the network on top of the PLM ack time
+        self.set_ack_time(150)
+        self.attribute('type', 'hub_socket')
+        if 'ip' in kwargs:
+            self.attribute('ip', kwargs['ip'])
+        self.attribute('port', kwargs.get('port', self.port or DEFAULT_PORT))
+        self._transport = TCPTransport(
+            self.ip, self.port, on_connect=self._port_reconnected,
+            on_disconnect=self._port_lost)
+        self._setup()
+
+    @property
+    def ip(self):
+        return self.attribute('ip')
+
+    @property
+    def port(self):
+        return self.attribute('port')
+
+    @property
+    def transport(self):
+        '''The TCPTransport, which counts connections and disconnections'''
+        return self._transport
+
+    def close(self):
+        self._transport.close()
+
+    def _is_port_ready(self):
+        return self._transport.connected
+
+    def _read_from_port(self):
+        self._read_buffer.extend(self._transport.read())
+
+    def _write_to_port(self, msg):
+        self._transport.write(msg)
@@ -0,0 +1,123 @@
+'''The DeviceInitializer class, which gathers the basic information about each
+device in the background after it is loaded.'''
+import time
+
+from insteon_mngr.sequences import InitializeDevice
+
+
+class DeviceInitializer(object):
+    '''Runs the InitializeDevice sequence of one device at a time, and only
+    while the modem the device is routed through is idle, so that startup
+    does not flood the modem.  Devices whose engine version, dev_cat, sub_cat
+    and firmware are known and whose aldb_delta was verified within
+    verify_age seconds are skipped.  Devices which the user touches move to
+    the front of the queue.
+
+    A device which has not finished within timeout seconds is counted as
+    failed and the next device is started.  Sleepy devices are not waited
+    on, their messages wait in the mailbox until the device wakes.'''
+    def __init__(self, core, verify_age=86400, timeout=60, interval=.5):
+        self._core = core
+        self.verify_age = verify_age
+        self.timeout = timeout
+        self.interval = interval
+        self._queue = []
+        self._active = None
+        self._active_sequence = None
+        self._active_start = 0
+        self._next_time = 0
+        self._progress = {'total': 0, 'done': 0, 'skipped': 0, 'failed': 0}
+
+    def add(self, device):
+        '''Called when a device is loaded or created'''
+        self._progress['total'] += 1
+        if self._is_current(device):
+            self._progress['skipped'] += 1
+        elif device not in self._queue and device is not self._active:
+            self._queue.append(device)
+
+    def remove(self, device):
+        '''Called when a device is deleted'''
+        if device in self._queue:
+            self._queue.remove(device)
+            self._progress['total'] -= 1
+
+    def prioritize(self, device):
+        '''Called when the user touches device, moves it to the front of the
+        queue if it has not been initialized yet'''
+        if device in self._queue:
+            self._queue.remove(device)
+            self._queue.insert(0, device)
+
+    def get_progress(self):
+        '''Returns a dict of the number of devices seen, initialized, skipped
+        as recently verified, failed and still waiting, and the address of
+        the device being initialized'''
+        ret = self._progress.copy()
+        ret['pending'] = len(self._queue)
+        ret['active'] = None
+        if self._active is not None:
+            ret['active'] = self._active.dev_addr_str
+        return ret
+
+    def process(self):
+        '''Called by the core loop.  Starts the initialization of the next
+        device once the last one is finished. Do not call directly.'''
+        now = time.time()
+        if self._active is not None:
+            if self._active_sequence.is_complete:
+                self._finish(self._active_sequence.is_success, now)
+            elif now > self._active_start + self.timeout:
+                self._finish(False, now)
+            else:
+                return
+        if now < self._next_time:
+            return
+        # Each modem is only checked once, not once per queued device
+        idle = [modem for modem in self._core.get_all_modems()
+                if modem.is_idle()]
+        if len(idle) == 0:
+            return
+        for device in self._queue:
+            if self._core.router.get_modem(device) in idle:
+                self._queue.remove(device)
+                self._start(device, now)
+                break
+
+    def _is_current(self, device):
+        ret = False
+        verified_time = device.attribute('aldb_verified_time')
+        if (device.engine_version is not None and
+                device.dev_cat is not None and
+                device.sub_cat is not None and
+                device.firmware is not None and
+                verified_time is not None and
+                verified_time > time.time() - self.verify_age):
+            ret = True
+        return ret
+
+    def _start(self, device, now):
+        print('initializing device', device.dev_addr_str,
+              len(self._queue), 'remaining')
+        sequence = InitializeDevice(device=device)
+        sequence.start()
+        if device.is_sleepy:
+            # Will finish whenever the device wakes up
+            self._progress['done'] += 1
+            self._next_time = now + self.interval
+        else:
+            self._active = device
+            self._active_sequence = sequence
+            self._active_start = now
+
+    def _finish(self, success, now):
+        if success:
+            self._progress['done'] += 1
+        else:
+            self._progress['failed'] += 1
+            print('unable to initialize device', self._active.dev_addr_str)
+        self._active = None
+        self._active_sequence = None
+        self._next_time = now + self.interval
+        if len(self._queue) == 0:
+            print('device initialization complete,', self.get_progress())
@@ -6,7 +6,29 @@ from insteon_mngr.aldb import ALDB
 from insteon_mngr.base_objects import Root, Group
 from insteon_mngr.devices import (GenericRcvdHandler, GenericSendHandler,
                              GenericFunctions, select_classes)
-from insteon_mngr.sequences import InitializeDevice, _ALDBSequence
+from insteon_mngr.sequences import _ALDBSequence
+
+# Battery powered devices which only listen for a short period after they
+# transmit.  Keys are (dev_cat, sub_cat), a sub_cat of None matches all
+SLEEPY_DEVICES = (
+    (0x00, 0x05),  # RemoteLinc
+    (0x00, 0x0D),  # KeyFOB
+    (0x10, None),  # Motion, Open/Close, Leak sensors
+)
+# Bridges within the sleepy categories are not battery powered
+AWAKE_DEVICES = (
+    (0x10, 0x00),
+    (0x10, 0x0A),
+)
+# Seconds that a sleepy device is assumed to be listening after it transmits
+AWAKE_TIME = 4
+# Seconds after the aldb_delta was verified during which the cached aldb is
+# trusted without asking the device, can be set per device with the
+# aldb_trust_window attribute
+TRUST_WINDOW = 300
+# Number of consecutive abandoned messages before a device is assumed to be
+# sleepy
+SLEEPY_TIMEOUTS = 3
 
 
 class Device_ALDB(ALDB):
@@ -15,6 +37,19 @@ class Device_ALDB(ALDB):
         super().__init__(parent)
         self.aldb_sequence = _ALDBSequence(device=self._device)
 
+    def is_trusted(self):
+        '''Returns True if the aldb_delta was verified within the trust
+        window, in which case the cache is used without checking it'''
+        ret = False
+        verified_time = self._device.attribute('aldb_verified_time')
+        trust_window = self._device.attribute('aldb_trust_window')
+        if trust_window is None:
+            trust_window = TRUST_WINDOW
+        if (verified_time is not None and
+                verified_time > time.time() - trust_window):
+            ret = True
+        return ret
+
     def get_aldb_key(self, msb, lsb):
         offset = 7 - (lsb % 8)
         highest_byte = lsb + offset
@@ -63,6 +98,12 @@ class InsteonDevice(Root):
         self.last_sent_msg = None
         self._recent_inc_msgs = {}
         self._last_rcvd_msg = None
+        self._mailbox = []
+        self._awake_until = 0
+        self._timeout_count = 0
+        # Set after repeated timeouts, kept in memory so that a device which
+        # was only unreachable for a while is not held in the mailbox for good
+        self._detected_sleepy = False
         if (self.dev_cat is not None and
                 self.sub_cat is not None and
                 self.firmware is not None):
@@ -71,8 +112,8 @@ class InsteonDevice(Root):
             self._rcvd_handler = GenericRcvdHandler(self)
             self.send_handler = GenericSendHandler(self)
             self.functions = GenericFunctions(self)
-        init_sequence = InitializeDevice(device=self)
-        init_sequence.start()
+        # Started in the background once the modem is idle
+        self._core.initializer.add(self)
 
     def _load_attributes(self, attributes):
         for name, value in attributes.items():
@@ -100,6 +141,34 @@ class InsteonDevice(Root):
     def engine_version(self):
         return self.attribute('engine_version')
 
+    @property
+    def is_sleepy(self):
+        '''Returns True if this is a battery powered device which only listens
+        briefly after it transmits.  Detected from the dev_cat or from repeated
+        timeouts, can be overridden by setting the sleepy attribute.'''
+        ret = self.attribute('sleepy')
+        if ret is None:
+            ret = self._detected_sleepy
+            for dev_cat, sub_cat in SLEEPY_DEVICES:
+                if (self.dev_cat == dev_cat and
+                        (sub_cat is None or self.sub_cat == sub_cat)):
+                    ret = (self.dev_cat, self.sub_cat) not in AWAKE_DEVICES
+                    break
+        return ret
+
+    @property
+    def is_awake(self):
+        '''Returns True if the device is expected to be listening'''
+        ret = True
+        if self.is_sleepy and self._awake_until < time.time():
+            ret = False
+        return ret
+
+    @property
+    def mailbox(self):
+        '''Returns the messages being held until a sleepy device wakes'''
+        return self._mailbox.copy()
+
     @property
     def last_rcvd_msg(self):
         return self._last_rcvd_msg
@@ -116,16 +185,26 @@ class InsteonDevice(Root):
 
     def msg_rcvd(self, msg):
         '''Checks to see if the incomming message is valid, extracts
-        hop and plm wait time data, passes valid messages onto the
-        dispatcher'''
-        self._set_plm_wait(msg)
+        hop data, passes valid messages onto the dispatcher'''
         if self._is_duplicate(msg):
             msg.allow_trigger = False
             print('Skipped duplicate msg')
         else:
             self._process_hops(msg)
             self.last_rcvd_msg = msg
+            self._timeout_count = 0
+            if (self._detected_sleepy and
+                    msg.insteon_msg.message_type in ('direct_ack',
+                                                     'direct_nack')):
+                # Answered a direct message, so it is listening after all
+                print('device', self.dev_addr_str,
+                      'responded, it is not sleepy')
+                self._detected_sleepy = False
+                self._release_mailbox()
             self._rcvd_handler.dispatch_msg_rcvd(msg)
+            # Sleepy devices are listening briefly after any transmission,
+            # typically a broadcast or cleanup
+            self._wake()
 
     def _process_hops(self, msg):
         if (msg.insteon_msg.message_type == 'direct' or
@@ -141,14 +220,6 @@ class InsteonDevice(Root):
                 hop_array = hop_array[extra_data:]
             self.attribute('hop_array', hop_array)
 
-    def _set_plm_wait(self, msg):
-        # Wait for additional hops to arrive
-        hop_delay = 50 if msg.insteon_msg.msg_length == 'standard' else 109
-        total_delay = hop_delay * msg.insteon_msg.hops_left
-        expire_time = (total_delay / 1000)
-        # Force a 5 millisecond delay for all
-        self.plm.wait_to_send = expire_time + (5 / 1000)
-
     def _is_duplicate(self, msg):
         '''Checks to see if this is a duplicate message'''
         ret = None
@@ -189,6 +260,59 @@ class InsteonDevice(Root):
         expire_time = time.time() + (total_delay / 1000)
         self._recent_inc_msgs[search_key] = expire_time
 
+    ###################################################################
+    ##
+    # Sleepy Device Handling
+    ##
+    ###################################################################
+
+    def queue_device_msg(self, message):
+        if self.is_awake:
+            super().queue_device_msg(message)
+        else:
+            self._mailbox.append(message)
+
+    def _resend_msg(self, message):
+        if self.is_awake:
+            super()._resend_msg(message)
+        else:
+            self._mailbox.insert(0, message)
+
+    def _wake(self):
+        '''Called when a sleepy device transmits, the device will listen for a
+        short period, so move everything from the mailbox to the out_queue'''
+        if self.is_sleepy:
+            self._awake_until = time.time() + AWAKE_TIME
+            self._release_mailbox()
+
+    def _release_mailbox(self):
+        if len(self._mailbox) > 0:
+            print('device', self.dev_addr_str, 'is awake, sending',
+                  len(self._mailbox), 'held messages')
+            self.out_queue.extend(self._mailbox)
+            self._mailbox = []
+            self._msg_queued()
+
+    def sleep(self):
+        '''Called when a sleepy device stops listening with messages still
+        queued, moves all pending messages into the mailbox'''
+        self._awake_until = 0
+        self._mailbox = self.out_queue + self._mailbox
+        self.out_queue = []
+
+    def msg_timed_out(self, msg):
+        '''Called by the modem when a message to this device is abandoned
+        after the retries are exceeded'''
+        # pylint: disable=W0613
+        self._timeout_count += 1
+        if (self._timeout_count >= SLEEPY_TIMEOUTS and
+                self.attribute('sleepy') is None and
+                not self._detected_sleepy):
+            print('device', self.dev_addr_str, 'failed to respond',
+                  self._timeout_count, 'times, assuming it is sleepy')
+            self._detected_sleepy = True
+            self.sleep()
+
     def remove_cleanup_msgs(self, msg):
         cmd_1 = msg.get_byte_by_name('cmd_1')
         cmd_2 = msg.get_byte_by_name('cmd_2')
@@ -209,7 +333,9 @@ class InsteonDevice(Root):
     ###################################################################
 
     def set_aldb_delta(self, delta):
+        '''Called when the cached aldb is known to match delta'''
         self.attribute('aldb_delta', delta)
+        self.attribute('aldb_verified_time', time.time())
 
     def set_engine_version(self, version):
         if version >= 0xFB:
@@ -0,0 +1,166 @@
+'''The Journal class, which records each change to the state of the network
+between writes of the config.'''
+import json
+import os
+import threading
+
+from insteon_mngr.aldb import decode_records
+
+# The journal is compacted into the config once it is larger than the config
+# or this many bytes, whichever is greater
+COMPACT_SIZE = 65536
+# The parts of a saved modem or device which are not attributes
+SECTIONS = ('aldb', 'groups', 'user_links', 'devices')
+
+
+class Journal(object):
+    '''An append only file of the changes made since the config was last
+    written.  Each line is a json entry which replaces one section of a
+    modem or device, one of attributes, aldb, groups, user_links or the list
+    of the devices of a modem, or which replaces some of the records of its
+    ALDB.  Replaying an entry more than once gives the
+    same result, so the journal can safely be replayed over a config which
+    already includes some of its entries.
+
+    When the config is compacted the journal is moved aside to path + '.1',
+    and new changes go to a fresh journal.  The old journal is removed once
+    the new config has been written.'''
+    def __init__(self, path):
+        self._path = path
+        self._old_path = path + '.1'
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._entries = 0
+        self._generation = 0
+
+    @property
+    def size(self):
+        '''The number of bytes written since the last compaction'''
+        return self._size
+
+    @property
+    def entries(self):
+        '''The number of entries written since the last compaction'''
+        return self._entries
+
+    def append(self, modem_id, device_id, section, value):
+        '''Records that section of the device, or of the modem if device_id is
+        None, is now value.  The entry is flushed to the OS before
+        returning.'''
+        entry = {'modem': modem_id, 'device': device_id, 'section': section,
+                 'value': value}
+        data = (json.dumps(entry, sort_keys=True, ensure_ascii=False) +
+                '\n').encode()
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self._path, 'ab')
+                self._file.write(data)
+                self._file.flush()
+            except OSError as err:
+                print('error writing to journal', err)
+                return
+            self._size += len(data)
+            self._entries += 1
+
+    def replay(self, read_data):
+        '''Applies the entries of the old and current journals to the dict
+        read from the config'''
+        count = 0
+        for path in (self._old_path, self._path):
+            try:
+                with open(path, 'r') as infile:
+                    for line in infile:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # The last write was cut short by a crash
+                            print('skipping damaged journal entry in', path)
+                            continue
+                        _apply(read_data, entry)
+                        count += 1
+            except FileNotFoundError:
+                pass
+        modems = read_data.get('modems', {})
+        for modem_id in list(modems.keys()):
+            if 'type' not in modems[modem_id]:
+                print('journal has no type for modem', modem_id)
+                del modems[modem_id]
+        if count > 0:
+            print('replayed', count, 'journal entries')
+        try:
+            self._size = os.path.getsize(self._path)
+        except OSError:
+            self._size = 0
+        return read_data
+
+    def rotate(self):
+        '''Moves the journal aside before the config is compacted, returns
+        the generation to pass to compacted() once the config is written'''
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            try:
+                if os.path.exists(self._old_path):
+                    # The last compaction was not written, keep its entries
+                    with open(self._path, 'rb') as infile, \
+                            open(self._old_path, 'ab') as outfile:
+                        outfile.write(infile.read())
+                    os.remove(self._path)
+                else:
+                    os.replace(self._path, self._old_path)
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                print('error rotating journal', err)
+            self._size = 0
+            self._entries = 0
+            self._generation += 1
+            return self._generation
+
+    def compacted(self, generation):
+        '''Called once a config including everything up to generation has
+        been written'''
+        with self._lock:
+            if generation != self._generation:
+                # A newer compaction has entries in the old journal
+                return
+            try:
+                os.remove(self._old_path)
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                print('error removing old journal', err)
+
+
+def _apply(read_data, entry):
+    modem = read_data.setdefault('modems', {}).setdefault(
+        entry['modem'], {'devices': {}})
+    target = modem
+    if entry['device'] is not None:
+        target = modem.setdefault('devices', {}).setdefault(entry['device'],
+                                                            {})
+    section = entry['section']
+    value = entry['value']
+    if section == 'attributes':
+        for name in list(target.keys()):
+            if name not in SECTIONS:
+                del target[name]
+        target.update(value)
+    elif section == 'aldb_records':
+        aldb = target.get('aldb', {})
+        if isinstance(aldb, str):
+            aldb = {}
+            for key, raw in decode_records(target['aldb']).items():
+                aldb[key] = raw.hex().upper()
+        aldb.update(value)
+        target['aldb'] = aldb
+    elif section == 'devices':
+        devices = target.setdefault('devices', {})
+        for address in list(devices.keys()):
+            if address not in value:
+                del devices[address]
+    else:
+        target[section] = value
@@ -11,8 +11,14 @@ from insteon_mngr.plm_message import PLM_Message
 from insteon_mngr.plm_schema import PLM_SCHEMA
 from insteon_mngr.devices import ModemSendHandler
 from insteon_mngr.modem_rcvd import ModemRcvdHandler
+from insteon_mngr.scene_tracker import SceneTracker
+from insteon_mngr.pacer import Pacer
 from insteon_mngr.sequences import WriteALDBRecordModem
 
+# Seconds a message is held while the connection to the modem is down
+# before it is failed
+MAX_HOLD_TIME = 120
+
 
 class Modem_ALDB(ALDB):
 
@@ -28,6 +34,8 @@ class Modem_ALDB(ALDB):
         self._device.add_device(BYTE_TO_ID(parsed_record['dev_addr_hi'],
                                            parsed_record['dev_addr_mid'],
                                            parsed_record['dev_addr_low']))
+        if parsed_record['controller']:
+            self._device.get_or_create_group(parsed_record['group'])
 
     def get_first_empty_addr(self):
         return self._get_next_position()
@@ -54,19 +62,26 @@ class Modem(Root):
 
     def __init__(self, core, **kwargs):
         self._devices = {}
+        self._unloaded_devices = set()
+        # The devices of this modem which may have messages waiting, the
+        # devices whose queue is empty are removed when they are checked
+        self._queued_devices = set()
         self.aldb = Modem_ALDB(self)
         self.trigger_mngr = Trigger_Manager(self)
         super().__init__(core, self, **kwargs)
         self._rcvd_handler = ModemRcvdHandler(self)
         self.send_handler = ModemSendHandler(self)
-        for group_number in range(0x01, 0xFF):
-            if self.get_object_by_group_num(group_number) is None:
-                self.create_group(group_number, ModemGroup)
+        self._create_used_groups()
         self._read_buffer = bytearray()
         self._last_sent_msg = None
+        self._early_scene = None
         self._msg_queue = []
         self._wait_to_send = 0
+        self.pacer = Pacer()
         self.port_active = True
+        self._port_lost_time = None
+        self._disconnects = 0
+        self._downtime = 0
         self.ack_time = 75
         self.attribute('base_group_number', 0x01)
 
@@ -85,7 +100,40 @@ class Modem(Root):
 
     def _load_devices(self, devices):
         for dev_id, attributes in devices.items():
-            self.add_device(dev_id, attributes=attributes)
+            if attributes is None:
+                # The store will load this device when it is first used
+                self._unloaded_devices.add(dev_id)
+            else:
+                self.add_device(dev_id, attributes=attributes)
+
+    def _create_used_groups(self):
+        '''Creates the groups which have attributes or are used by a link,
+        any other group is created the first time it is used'''
+        for group_number, attributes in self._groups_config.items():
+            if len(attributes) > 0:
+                self.get_or_create_group(group_number)
+        for record in self.aldb.aldb.values():
+            parsed_record = record.parse_record()
+            if parsed_record['in_use'] and parsed_record['controller']:
+                self.get_or_create_group(parsed_record['group'])
+        for device in self._devices.values():
+            self._create_link_groups(device)
+
+    def _create_link_groups(self, device):
+        '''Creates the groups of this modem which control a user link of
+        device'''
+        for user_link in device.get_all_user_links().values():
+            if user_link.controller_id == self.dev_addr_str:
+                self.get_or_create_group(user_link.controller_group_number)
+
+    def _load_device(self, device_id):
+        '''Loads a device which was left unloaded at startup'''
+        self._unloaded_devices.discard(device_id)
+        attributes = self.core.store.load_device(device_id)
+        device = self.add_device(device_id, attributes=attributes)
+        self._create_link_groups(device)
+        self.core.store.mark_clean(device)
+        return device
 
     def _setup(self):
         self.update_device_classes()
@@ -110,25 +158,40 @@ class Modem(Root):
 
     def add_device(self, device_id, **kwargs):
         device_id = device_id.upper()
+        if device_id in self._unloaded_devices:
+            return self._load_device(device_id)
         if device_id not in self._devices:
             self._devices[device_id] = InsteonDevice(self.core,
                                                      self,
                                                      device_id=device_id,
                                                      **kwargs)
+            self._state_changed('devices')
         return self._devices[device_id]
 
     def delete_device(self, device_id):
         '''Removes a device from the Modems list of devices'''
         device_id = device_id.upper()
+        if device_id in self._unloaded_devices:
+            self._load_device(device_id)
         if device_id in self._devices:
             device = self.core.get_device_by_addr(device_id)
             for group in device.get_all_groups():
                 group.do_delete_callback()
+            self.core.scene_map.remove_aldb(device.aldb)
+            self.core.initializer.remove(device)
+            self._queued_devices.discard(device)
             del self._devices[device_id]
+            self._state_changed('devices')
 
     def port(self):
         return NotImplemented
 
+    @property
+    def channel(self):
+        '''The ChannelEstimator of the powerline this modem is on, which is
+        shared with the other modems on the same powerline'''
+        return self.core.get_channel(self.attribute('powerline'))
+
     @property
     def wait_to_send(self):
         return self._wait_to_send
@@ -145,6 +208,8 @@ class Modem(Root):
             ret = self
         else:
             try:
+                if addr in self._unloaded_devices:
+                    self._load_device(addr)
                 ret = self._devices[addr]
             except KeyError:
                 # print('error, unknown device address=', addr)
@@ -152,6 +217,8 @@ class Modem(Root):
         return ret
 
     def get_all_devices(self):
+        for device_id in list(self._unloaded_devices):
+            self._load_device(device_id)
         ret = []
         for device in self._devices.values():
             ret.append(device)
@@ -160,6 +227,33 @@ class Modem(Root):
     def update_device_classes(self):
         pass
 
+    @property
+    def base_group(self):
+        return self.get_or_create_group(self.base_group_number)
+
+    def get_or_create_group(self, search_num):
+        '''Returns the modem group, creating any group from 1 to 254 which
+        does not exist yet.  Lookups which should not create a group use
+        get_object_by_group_num.'''
+        ret = self.get_object_by_group_num(search_num)
+        if ret is None and search_num in range(0x01, 0xFF):
+            self.create_group(search_num, ModemGroup)
+            ret = self._groups[search_num]
+        return ret
+
+    def get_all_groups(self):
+        '''Returns only the groups which have been created'''
+        return list(self._groups.values())
+
+    def save_groups(self):
+        '''Groups without attributes are not saved, they are created again
+        when they are used'''
+        ret = {}
+        for group_number, attributes in super().save_groups().items():
+            if len(attributes) > 0:
+                ret[group_number] = attributes
+        return ret
+
     def create_group(self, group_num, group_class):
         attributes = {}
         if group_num in self._groups_config:
@@ -186,14 +280,14 @@ class Modem(Root):
     def process_unacked_msg(self):
         '''Called by the core loop. Checks for unacked messages and queues them
         for resending.  Do not call directly.'''
-        if self._is_ack_pending():
+        if self._is_ack_pending() and self._is_port_ready():
             msg = self._last_sent_msg
         else:
             return
         now = datetime.datetime.now().strftime("%M:%S.%f")
         # allow 75 milliseconds for the PLM to ack a message
         if msg.plm_ack is False:
-            if msg.time_due < time.time() - (self.ack_time / 1000):
+            if msg.time_due < time.time() - (self._get_ack_time() / 1000):
                 print(now, 'PLM failed to ack the last message')
                 if msg.plm_retry >= 3:
                     print(now, 'PLM retries exceeded, abandoning this message')
@@ -215,16 +309,22 @@ class Modem(Root):
             # Add 1 additional second based on trial and error, perhaps
             # to allow device to 'think'
             total_delay = (total_hops * hop_delay / 1000) + 1
+            total_delay += self._get_transport_delay()
             if msg.time_plm_ack < time.time() - total_delay:
                 print(
                     now,
                     'device failed to ack a message, total delay =',
                     total_delay, 'total hops=', total_hops)
                 if msg.insteon_msg.device_retry >= 3:
+                    if self.core.router.failover(msg, self):
+                        msg.insteon_msg.device_retry = 0
+                        self._resend_failed_msg()
+                        return
                     print(
                         now,
                         'device retries exceeded, abandoning this message')
                     msg.failed = True
+                    msg.device.msg_timed_out(msg)
                 else:
                     msg.insteon_msg.device_retry += 1
                     self._resend_failed_msg()
@@ -233,37 +333,92 @@ class Modem(Root):
     def process_queue(self):
         '''Called by the core loop. Determines and sends the next message.
         Do not call directly'''
+        if not self._is_port_ready():
+            self._expire_held_msgs()
+            return
         if (not self._is_ack_pending() and
-                time.time() > self.wait_to_send):
-            last_device = None
-            send_msg = None
-            if self._last_sent_msg:
-                last_device = self._last_sent_msg.device
-            if (last_device is not None and
-                    len(last_device.out_queue) > 0):
-                send_msg = last_device.out_queue.pop(0)
-            else:
-                devices = [self, ]
-                msg_time = 0
-                sending_device = None
-                for device in self._devices.values():
-                    devices.append(device)
-                for device in devices:
-                    if len(device.out_queue) > 0:
-                        dev_msg_time = device.out_queue[0].creation_time
-                        if dev_msg_time and (msg_time == 0 or
-                                             dev_msg_time < msg_time):
-                            sending_device = device
-                            msg_time = dev_msg_time
-                if sending_device is not None:
-                    send_msg = sending_device.out_queue.pop(0)
-            if send_msg is not None:
+                time.time() > self.wait_to_send and
+                self.pacer.can_send()):
+            sending_device = self._get_sending_device()
+            # The channel is only checked when there is something to send,
+            # so that its holds count real delays
+            if sending_device is not None and self.channel.is_idle():
+                send_msg = sending_device.out_queue.pop(0)
                 if send_msg.insteon_msg:
                     device = send_msg.device
                     device.update_message_history(send_msg)
                     device.last_sent_msg = send_msg
+                    self.core.router.msg_sent(device, self, send_msg)
                 self._send_msg(send_msg)
 
+    def _get_sending_device(self):
+        '''Returns the device, or this modem, whose message is to be sent
+        next, None if nothing is waiting'''
+        ret = None
+        last_device = None
+        if self._last_sent_msg:
+            last_device = self._last_sent_msg.device
+        if (last_device is not None and
+                last_device.is_awake and
+                len(last_device.out_queue) > 0 and
+                self._is_routed_here(last_device)):
+            ret = last_device
+        else:
+            devices = [self] + self._get_routed_devices()
+            msg_time = 0
+            for device in devices:
+                if not device.is_awake:
+                    # The device stopped listening before its messages were
+                    # sent.  They go back to the mailbox, which empties the
+                    # queue, so this happens once each time it falls asleep
+                    if len(device.out_queue) > 0:
+                        device.sleep()
+                    continue
+                if len(device.out_queue) > 0:
+                    dev_msg_time = device.out_queue[0].creation_time
+                    if dev_msg_time and (msg_time == 0 or
+                                         dev_msg_time < msg_time):
+                        ret = device
+                        msg_time = dev_msg_time
+        return ret
+
+    def is_idle(self):
+        '''Returns True if no message is awaiting an ack and no messages are
+        waiting to be sent'''
+        ret = not self._is_ack_pending() and len(self.out_queue) == 0
+        if ret:
+            for device in self._get_routed_devices():
+                if device.is_awake:
+                    ret = False
+                    break
+        return ret
+
+    def _is_routed_here(self, device):
+        return device is self or self.core.router.get_modem(device) is self
+
+    def _get_routed_devices(self):
+        '''Returns the devices, on any modem, with messages waiting which
+        are to be sent through this modem'''
+        ret = []
+        for modem in self.core.get_all_modems():
+            for device in modem._get_queued_devices():
+                if device is not modem and self._is_routed_here(device):
+                    ret.append(device)
+        return ret
+
+    def _get_queued_devices(self):
+        '''Returns the devices of this modem with messages waiting'''
+        ret = []
+        for device in list(self._queued_devices):
+            if len(device.out_queue) == 0:
+                self._queued_devices.discard(device)
+                # A message may have been queued by another thread
+                if len(device.out_queue) == 0:
+                    continue
+                self._queued_devices.add(device)
+            ret.append(device)
+        return ret
+
     def _advance_to_msg_start(self):
         '''Removes extraneous bytes from start of read buffer'''
         if len(self._read_buffer) >= 2:
@@ -278,10 +433,36 @@ class Modem(Root):
                 print('resulting buffer is', BYTE_TO_HEX(self._read_buffer))
             if self._read_buffer.startswith(wait_prefix):
                 print('need to slow down!!', BYTE_TO_HEX(self._read_buffer))
-                self.wait_to_send = .5
+                self.pacer.backoff()
                 del self._read_buffer[0:1]
                 self._advance_to_msg_start()
 
+    def get_scene_tracker(self):
+        '''Returns the SceneTracker of the scene command currently being sent
+        or None'''
+        ret = None
+        if self._last_sent_msg:
+            ret = self._last_sent_msg.scene_tracker
+        return ret
+
+    def scene_responder_acked(self, device, group):
+        '''Called when a device sends a cleanup ack for a group'''
+        tracker = self.get_scene_tracker()
+        if (tracker is not None and
+                tracker.group.group_number == group):
+            tracker.responder_acked(device.dev_addr_str)
+            if tracker.released_early:
+                self._early_scene = tracker
+
+    def scene_responder_failed(self, device_id, group):
+        '''Called when the modem reports a device failed to ack a scene'''
+        tracker = self.get_scene_tracker()
+        if (tracker is not None and
+                tracker.group.group_number == group):
+            tracker.responder_failed(device_id)
+            if tracker.released_early:
+                self._early_scene = tracker
+
     def _is_ack_pending(self):
         ret = False
         if self._last_sent_msg and not self._last_sent_msg.failed:
@@ -325,6 +506,15 @@ class Modem(Root):
                 del self._read_buffer[0:index]
         return ret
 
+    def _get_ack_time(self):
+        '''Returns the milliseconds to wait for the modem to ack a message'''
+        return self.ack_time
+
+    def _get_transport_delay(self):
+        '''Returns the seconds added to device ack timeouts to allow for the
+        delay in receiving messages from the modem'''
+        return 0
+
     def _read_from_port(self):
         return NotImplemented
 
@@ -341,19 +531,27 @@ class Modem(Root):
 
     def _msg_dispatcher(self, msg):
         if msg.plm_resp_ack:
+            self.pacer.success()
             if 'ack_act' in msg.plm_schema:
                 msg.plm_schema['ack_act'](self, msg)
             else:
                 # Attempting default action
                 self._rcvd_handler._rcvd_plm_ack(msg)
+            if (self._early_scene is not None and
+                    self._early_scene.message is not self._last_sent_msg):
+                # The modem has acked a later message, so the cleanup
+                # status of the early released scene will not come now
+                self._early_scene = None
         elif msg.plm_resp_nack:
-            self.wait_to_send = .5
             if 'nack_act' in msg.plm_schema:
+                # An expected answer, such as the end of the ALDB, not a
+                # sign that the modem is busy
                 msg.plm_schema['nack_act'](self, msg)
             else:
+                self.pacer.backoff()
                 print('PLM sent NACK to last command, retrying last message')
         elif msg.plm_resp_bad_cmd:
-            self.wait_to_send = .5
+            self.pacer.backoff()
             if 'bad_cmd_act' in msg.plm_schema:
                 msg.plm_schema['bad_cmd_act'](self, msg)
             else:
@@ -361,8 +559,69 @@ class Modem(Root):
         elif 'recv_act' in msg.plm_schema:
             msg.plm_schema['recv_act'](self, msg)
 
+    def get_port_stats(self):
+        '''Returns a dict of the number of times the connection to the modem
+        was lost and the total seconds it has been down'''
+        downtime = self._downtime
+        if self._port_lost_time is not None:
+            downtime += time.time() - self._port_lost_time
+        return {
+            'connected': self._is_port_ready(),
+            'disconnects': self._disconnects,
+            'downtime': downtime
+        }
+
+    def close(self):
+        '''Closes the connection to the modem and stops any threads used to
+        reach it, called by the core when it is closed'''
+        pass
+
+    def _is_port_ready(self):
+        '''Returns False while the connection to the modem is down, messages
+        are held rather than sent and failed'''
+        return True
+
+    def _expire_held_msgs(self):
+        '''Fails the messages which have been held for longer than
+        MAX_HOLD_TIME while the connection is down'''
+        cutoff = time.time() - MAX_HOLD_TIME
+        if self._is_ack_pending():
+            msg = self._last_sent_msg
+            if msg.creation_time < cutoff:
+                print('modem is unavailable, abandoning the message in flight')
+                msg.failed = True
+        # The same devices process_queue would send for, including those of
+        # other modems which the router sends through this one
+        for device in [self] + self._get_routed_devices():
+            for msg in device.out_queue.copy():
+                if msg.creation_time < cutoff:
+                    print('modem is unavailable, abandoning a held message')
+                    device.out_queue.remove(msg)
+                    msg.failed = True
+
+    def _port_lost(self):
+        '''Called by the port when the connection to the modem drops'''
+        if self._port_lost_time is None:
+            self._port_lost_time = time.time()
+            self._disconnects += 1
+
+    def _port_reconnected(self):
+        '''Called by the port each time the connection to the modem is
+        established.  A message which was in flight when the connection
+        dropped is sent again without waiting for its ack to time out.'''
+        if self._port_lost_time is not None:
+            self._downtime += time.time() - self._port_lost_time
+            self._port_lost_time = None
+            # The modem may have been swapped or reset while it was gone
+            self.send_command('plm_info')
+        msg = self._last_sent_msg
+        if self._is_ack_pending() and msg.plm_ack is False:
+            print('resending the message in flight after reconnecting')
+            self._resend_failed_msg()
+
     def _send_msg(self, msg):
         self._last_sent_msg = msg
+        self.pacer.sent()
         self._write(msg)
 
     def _resend_failed_msg(self):
@@ -401,6 +660,7 @@ class Modem(Root):
 class ModemGroup(Group):
     def __init__(self, root, **kwargs):
         super().__init__(root, **kwargs)
+        self._scene_tracker = None
 
     def create_controller_link_sequence(self, user_link):
         '''Creates a controller link sequence based on a passed user_link,
@@ -453,12 +713,23 @@ class ModemGroup(Group):
             # will cause it to abandon all link process
             message.seq_lock = True
             # Time with retries for failed objects, plus we actively end it on
-            # success
+            # success, or as soon as every responder has answered
             wait_time = (len(records) + 1) * (87 / 1000 * 18)
             message.seq_time = wait_time
             message.extra_ack_time = wait_time
+            self._scene_tracker = SceneTracker(self, records)
+            self._scene_tracker.message = message
+            message.scene_tracker = self._scene_tracker
             self.device.plm.queue_device_msg(message)
 
+    def get_scene_report(self):
+        '''Returns a dict describing the outcome of the last scene command
+        sent to this group, or None if no scene command has been sent'''
+        ret = None
+        if self._scene_tracker is not None:
+            ret = self._scene_tracker.report()
+        return ret
+
     def get_features(self):
         '''Returns the intrinsic parameters of a device, these are not user
         editable so are not saved in the config.json file'''
@@ -64,7 +64,7 @@ class ModemRcvdHandler(object):
         device = self._device.get_device_by_addr(device_id)
         # TODO these are broken
         if msg.get_byte_by_name('link_flags') == 0xE2:
-            plm = self._device.get_object_by_group_num(msg.get_byte_by_name('group'))
+            plm = self._device.get_or_create_group(msg.get_byte_by_name('group'))
             trigger.trigger_function = lambda: plm.send_handler.create_controller_link(device)
         else:
             device = device.get_object_by_group_num(
@@ -74,9 +74,32 @@ class ModemRcvdHandler(object):
         trigger.queue()
 
     def _rcvd_insteon_msg(self, msg):
-        insteon_obj = self._device.get_device_by_addr(msg.insteon_msg.from_addr_str)
-        if insteon_obj is not None:
+        self._update_channel(msg)
+        # Any modem may hear a device, duplicates are dropped by the device.
+        # Messages sent by our other modems are ignored.
+        core = self._device.core
+        insteon_obj = core.get_device_by_addr(msg.insteon_msg.from_addr_str)
+        if (insteon_obj is not None and
+                insteon_obj not in core.get_all_modems()):
             insteon_obj.msg_rcvd(msg)
+            core.router.msg_rcvd(insteon_obj, self._device, msg)
+            if insteon_obj.plm is not self._device:
+                # Sequences wait on triggers in the device's own modem
+                insteon_obj.plm.trigger_mngr.test_triggers(msg)
+
+    def _update_channel(self, msg):
+        '''Every frame holds the channel for its remaining hops, including
+        those from devices we don't know.  An all-link broadcast is followed
+        by a cleanup to each responder.'''
+        insteon_msg = msg.insteon_msg
+        channel = self._device.channel
+        channel.frame_rcvd(insteon_msg.msg_length, insteon_msg.hops_left)
+        if (insteon_msg.message_type == 'alllink_broadcast' and
+                msg.get_byte_by_name('cmd_1') != 0x06):
+            members = self._device.core.scene_map.get_members(
+                insteon_msg.from_addr_str,
+                msg.get_byte_by_name('to_addr_low'))
+            channel.cleanups_expected(len(members), insteon_msg.max_hops)
 
     def _rcvd_plm_x10_ack(self, msg):
         pass
@@ -155,14 +178,26 @@ class ModemRcvdHandler(object):
             self._device.set_dev_version(dev_cat, sub_cat, firmware)
 
     def _rcvd_all_link_clean_status(self, msg):
-        if self._device._last_sent_msg.plm_cmd_type == 'all_link_send':
+        early_scene = self._device._early_scene
+        self._device._early_scene = None
+        if (early_scene is not None and
+                early_scene.message is not self._device._last_sent_msg):
+            # The lock was already released when every responder answered
+            msg.allow_trigger = False
+            print('Received all link clean status for completed scene')
+        elif self._device._last_sent_msg.plm_cmd_type == 'all_link_send':
             self._device._last_sent_msg.seq_lock = False
+            tracker = self._device._last_sent_msg.scene_tracker
+            if tracker is not None:
+                tracker.status_rcvd()
             if msg.plm_resp_ack:
-                self._device._last_sent_msg.plm_ack = True
+                if self._device._last_sent_msg.plm_ack is False:
+                    self._device._last_sent_msg.plm_ack = True
                 print('Send All Link - Success')
             elif msg.plm_resp_nack:
                 print('Send All Link - Error')
-                self._device._last_sent_msg.plm_ack = True
+                if self._device._last_sent_msg.plm_ack is False:
+                    self._device._last_sent_msg.plm_ack = True
                 # We don't resend, instead we rely on individual device
                 # alllink cleanups to do the work
                 # TODO is the right?  When does a NACK acutally occur?
@@ -183,8 +218,11 @@ class ModemRcvdHandler(object):
         # TODO We are ignoring the all_link cleanup nacks sent directly
         # by the device, do anything with them?
         cmd = self._device._last_sent_msg.get_byte_by_name('cmd_1')
-        fail_device.send_handler.send_all_link_clean(
-            msg.get_byte_by_name('group'), cmd)
+        self._device.scene_responder_failed(BYTE_TO_HEX(failed_addr),
+                                            msg.get_byte_by_name('group'))
+        if fail_device is not None:
+            fail_device.send_handler.send_all_link_clean(
+                msg.get_byte_by_name('group'), cmd)
 
     def _rcvd_all_link_start(self, msg):
         if msg.plm_resp_ack:
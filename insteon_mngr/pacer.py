@@ -0,0 +1,60 @@
+'''The Pacer class, which limits the rate at which messages are written to the
+modem.'''
+import time
+
+
+class Pacer(object):
+    '''A token bucket whose rate is adjusted by additive increase and
+    multiplicative decrease.  Each clean ack raises the send rate by
+    increase messages per second up to max_rate.  A 0x15 or NACK from the
+    modem cuts the rate by decrease, down to min_rate, and empties the
+    bucket so that the next message waits for at least one token.'''
+    def __init__(self, max_rate=20, min_rate=.5, increase=1, decrease=.5,
+                 burst=2):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._rate = max_rate
+        self._tokens = burst
+        self._last_time = time.time()
+        self._backoff_count = 0
+
+    @property
+    def send_rate(self):
+        '''The current maximum number of messages sent per second'''
+        return self._rate
+
+    @property
+    def backoff_count(self):
+        '''The number of times the modem has asked us to slow down'''
+        return self._backoff_count
+
+    def can_send(self):
+        '''Returns True if a message may be sent now'''
+        self._refill()
+        return self._tokens >= 1
+
+    def sent(self):
+        '''Called each time a message is written to the modem'''
+        self._refill()
+        self._tokens -= 1
+
+    def success(self):
+        '''Called when the modem acks a message'''
+        self._rate = min(self._rate + self.increase, self.max_rate)
+
+    def backoff(self):
+        '''Called when the modem sends a 0x15 or a NACK'''
+        self._refill()
+        self._rate = max(self._rate * self.decrease, self.min_rate)
+        self._tokens = min(self._tokens, 0)
+        self._backoff_count += 1
+        print('slowing sends to', round(self._rate, 2), 'per second')
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._last_time) * self._rate)
+        self._last_time = now
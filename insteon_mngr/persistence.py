@@ -0,0 +1,397 @@
+'''The stores which save the state of the network, JSONStore saves it to
+config.json.'''
+import json
+import os
+import threading
+import time
+
+from insteon_mngr import BYTE_TO_HEX
+from insteon_mngr.journal import Journal, COMPACT_SIZE
+
+# The indent used in the config file
+INDENT = '    '
+
+
+def _sync_dir(path):
+    '''Syncs the directory containing path, so that a rename into it
+    survives a crash'''
+    if not hasattr(os, 'O_DIRECTORY'):
+        # Not possible on Windows
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)),
+                 os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BaseStore(object):
+    '''The base class of the stores.  Devices and modems mark themselves as
+    dirty when an attribute, group, ALDB record or user link changes.  Every
+    save_interval seconds, if anything is dirty, the store takes a snapshot
+    of the dirty devices on the core thread.  The snapshot is written by a
+    writer thread, so the core never waits on the disk.  The writer thread
+    runs until close is called or the main thread exits.'''
+    def __init__(self, save_interval=60):
+        self.save_interval = save_interval
+        self._dirty = set()
+        self._last_saved_time = 0
+        self._pending = None
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._stats = {'saves': 0, 'skipped': 0, 'devices_serialized': 0,
+                       'last_seconds': 0, 'last_write_seconds': 0,
+                       'last_bytes': 0, 'total_bytes': 0}
+        self._writer_thread = threading.Thread(target=self._writer)
+        self._writer_thread.start()
+
+    def load(self):
+        '''Returns the saved state as a dict of modems, each containing a
+        dict of its devices'''
+        return NotImplemented
+
+    def load_device(self, address):
+        '''Returns the saved attributes of a device which was not loaded at
+        startup'''
+        return NotImplemented
+
+    def mark_dirty(self, root, section=None, record=None):
+        '''Called when anything saved for this device or modem changes,
+        section is the part which changed or None if not known, record is
+        the ALDB record if only one record changed'''
+        self._dirty.add(root)
+
+    def mark_clean(self, root):
+        '''Called when a device has just been loaded from the store'''
+        self._dirty.discard(root)
+
+    def mark_all_clean(self):
+        '''Called once the state has been loaded, as it matches the store'''
+        self._dirty = set()
+
+    def close(self):
+        '''Stops the writer thread once it has written any pending
+        snapshot'''
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._writer_thread.join()
+
+    def get_stats(self):
+        '''Returns a dict of the number of saves made and skipped, the devices
+        serialized, the seconds spent building the last save on the core
+        thread and writing it on the writer thread, and the bytes written'''
+        return self._stats.copy()
+
+    def save(self, modems, is_exit=False):
+        '''Saves the state if anything has changed since the last save and
+        save_interval seconds have passed, or on exit'''
+        if not is_exit and not self._is_save_due():
+            return
+        self._last_saved_time = time.time()
+        if not self._has_changes() and not is_exit:
+            self._stats['skipped'] += 1
+            return
+        start_time = time.time()
+        dirty = self._dirty
+        self._dirty = set()
+        try:
+            snapshot = self._snapshot(modems, dirty)
+        except Exception:
+            # Try these again on the next save
+            self._dirty.update(dirty)
+            print('error saving the state')
+            return
+        self._stats['last_seconds'] = time.time() - start_time
+        with self._condition:
+            snapshot = self._merge_pending(self._pending, snapshot)
+            self._pending = None
+            if not is_exit:
+                self._pending = snapshot
+                self._condition.notify()
+        if is_exit:
+            # The writer thread has stopped, write from here
+            self._write(snapshot)
+
+    def _is_save_due(self):
+        return self._last_saved_time <= time.time() - self.save_interval
+
+    def _has_changes(self):
+        return len(self._dirty) > 0
+
+    def _snapshot(self, modems, dirty):
+        '''Returns an immutable snapshot of the state to be written'''
+        return NotImplemented
+
+    def _merge_pending(self, pending, snapshot):
+        '''Combines a snapshot which has not been written yet with a newer
+        one'''
+        return snapshot
+
+    def _write(self, snapshot):
+        '''Writes the snapshot, called from the writer thread'''
+        return NotImplemented
+
+    def _writer(self):
+        while threading.main_thread().is_alive():
+            with self._condition:
+                if self._pending is None and not self._closed:
+                    self._condition.wait(.5)
+                snapshot = self._pending
+                self._pending = None
+                closed = self._closed
+            if snapshot is not None:
+                self._write(snapshot)
+            if closed:
+                return
+
+    def _record_save(self, seconds, length):
+        self._stats['saves'] += 1
+        self._stats['last_write_seconds'] = seconds
+        self._stats['last_bytes'] = length
+        self._stats['total_bytes'] += length
+        print('saved state,', length, 'bytes in',
+              round(self._stats['last_seconds'] + seconds, 3), 'seconds')
+
+    def _serialize(self, root):
+        self._stats['devices_serialized'] += 1
+        ret = self._serialize_section(root, 'attributes')
+        for section in ('aldb', 'groups', 'user_links'):
+            ret[section] = self._serialize_section(root, section)
+        return ret
+
+    def _serialize_section(self, root, section):
+        if section == 'aldb':
+            ret = root.aldb.get_all_records_str()
+        elif section == 'groups':
+            ret = root.save_groups()
+        elif section == 'user_links':
+            ret = root.save_user_links()
+        elif section == 'devices':
+            ret = sorted(list(root._devices.keys()) +
+                         list(root._unloaded_devices))
+        else:
+            ret = root._attributes.copy()
+        return ret
+
+
+class JSONStore(BaseStore):
+    '''Saves the modems and devices to a json file.  The json of each device
+    is cached, and only dirty devices are serialized again.  The file is
+    written to a temporary file, synced and then renamed over the config,
+    the previous config is kept as a backup which is loaded if the config is
+    damaged.  If the write fails, the file is written again on the next
+    save.
+
+    If compact_aldb is True each ALDB is saved as a single base64 string
+    rather than a dict of hex records, which is less than half the size.
+
+    If journal is True the changes are also appended to a journal beside the
+    config, which is replayed when the config is loaded.  Changes are
+    gathered and journaled once per loop, each changed section is written
+    once, except the ALDB where only the changed records are written.  The
+    config is then only written when the journal grows past COMPACT_SIZE or
+    the size of the config, rather than every save_interval seconds.'''
+    def __init__(self, config_path, save_interval=60, journal=False,
+                 compact_aldb=False):
+        self._config_path = config_path
+        self.compact_aldb = compact_aldb
+        self._backup_path = config_path + '.bak'
+        self._temp_path = config_path + '.tmp'
+        self._fragments = {}
+        self._journal = None
+        if journal:
+            self._journal = Journal(config_path + '.journal')
+        self._loaded = False
+        self._compact_now = False
+        # A snapshot whose write failed, the next save writes it again
+        self._failed = None
+        self._modem_ids = set()
+        # The sections changed since the last loop, keyed by (root,
+        # section).  The value is a set of the changed ALDB records, or None
+        # if the whole section is to be written.
+        self._changed = {}
+        super().__init__(save_interval)
+
+    def load(self):
+        '''Returns the dict read from the config file, falling back to the
+        previous generation if the config is missing or damaged, or an empty
+        dict'''
+        read_data = self._read(self._config_path)
+        if read_data is None:
+            read_data = self._read(self._backup_path)
+            if read_data is not None:
+                print('loaded the previous config from', self._backup_path)
+        if read_data is None:
+            read_data = {}
+        if self._journal is not None:
+            self._journal.replay(read_data)
+            self._modem_ids = set(read_data.get('modems', {}).keys())
+        return read_data
+
+    def mark_dirty(self, root, section=None, record=None):
+        super().mark_dirty(root, section, record)
+        if self._journal is None or not self._loaded:
+            return
+        if root.plm is root and root.dev_addr_str not in self._modem_ids:
+            # New or readdressed modems are written to the config right away
+            self._compact_now = True
+            return
+        sections = ('attributes', 'aldb', 'groups', 'user_links')
+        if section is not None:
+            sections = (section,)
+        for section in sections:
+            key = (root, section)
+            if record is None:
+                self._changed[key] = None
+            elif key not in self._changed:
+                self._changed[key] = set([record])
+            elif self._changed[key] is not None:
+                self._changed[key].add(record)
+
+    def save(self, modems, is_exit=False):
+        self._journal_changes()
+        super().save(modems, is_exit)
+
+    def _journal_changes(self):
+        changed = self._changed
+        self._changed = {}
+        for (root, section), records in changed.items():
+            device_id = None
+            if root.plm is not root:
+                device_id = root.dev_addr_str
+            if records is None:
+                value = self._serialize_section(root, section)
+            else:
+                section = 'aldb_records'
+                value = {}
+                for record in records:
+                    key = record.key
+                    if key is not None:
+                        value[key] = BYTE_TO_HEX(record.raw)
+            self._journal.append(root.plm.dev_addr_str, device_id, section,
+                                 value)
+
+    def mark_all_clean(self):
+        super().mark_all_clean()
+        # Changes from here on are not in the config
+        self._loaded = True
+
+    def _serialize_section(self, root, section):
+        ret = None
+        if section == 'aldb' and self.compact_aldb:
+            ret = root.aldb.get_all_records_compact()
+        if ret is None:
+            ret = super()._serialize_section(root, section)
+        return ret
+
+    def get_stats(self):
+        ret = super().get_stats()
+        if self._journal is not None:
+            ret['journal_entries'] = self._journal.entries
+            ret['journal_bytes'] = self._journal.size
+        return ret
+
+    def _is_save_due(self):
+        if self._journal is None:
+            return super()._is_save_due()
+        if self._failed is not None:
+            # Retry once every save_interval
+            return super()._is_save_due()
+        return (self._compact_now or
+                self._journal.size > max(COMPACT_SIZE,
+                                         self._stats['last_bytes']))
+
+    def _has_changes(self):
+        return super()._has_changes() or self._failed is not None
+
+    def _merge_pending(self, pending, snapshot):
+        # Each snapshot is the whole file, so the newest replaces any
+        # unwritten or failed one
+        self._failed = None
+        return snapshot
+
+    def _read(self, path):
+        ret = None
+        try:
+            with open(path, 'r') as infile:
+                ret = json.loads(infile.read())
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            print('unable to read config file', path)
+        return ret
+
+    def _snapshot(self, modems, dirty):
+        '''Builds the json of the whole file from the cached fragments,
+        returns it with the generation of the journal it replaces'''
+        generation = None
+        if self._journal is not None:
+            # Anything changed from here on is in the new journal
+            generation = self._journal.rotate()
+            self._compact_now = False
+            self._modem_ids = set(modem.dev_addr_str for modem in modems)
+        modem_parts = []
+        for modem in modems:
+            device_parts = []
+            for address, device in list(modem._devices.items()):
+                device_parts.append(
+                    INDENT * 4 + json.dumps(address) + ': ' +
+                    self._get_fragment(device, dirty, 4))
+            modem_json = self._get_fragment(modem, dirty, 2)
+            devices_json = '{}'
+            if len(device_parts) > 0:
+                devices_json = ('{\n' + ',\n'.join(device_parts) + '\n' +
+                                INDENT * 3 + '}')
+            modem_parts.append(
+                INDENT * 2 + json.dumps(modem.dev_addr_str) + ': ' +
+                modem_json[:-1].rstrip() + ',\n' +
+                INDENT * 3 + '"devices": ' + devices_json + '\n' +
+                INDENT * 2 + '}')
+        self._forget_removed(modems)
+        return (generation,
+                '{\n' + INDENT + '"modems": {\n' + ',\n'.join(modem_parts) +
+                '\n' + INDENT + '}\n}')
+
+    def _get_fragment(self, root, dirty, depth):
+        if root in dirty or root not in self._fragments:
+            fragment = json.dumps(self._serialize(root), sort_keys=True,
+                                  indent=4, ensure_ascii=False)
+            self._fragments[root] = fragment.replace('\n',
+                                                     '\n' + INDENT * depth)
+        return self._fragments[root]
+
+    def _forget_removed(self, modems):
+        current = set(modems)
+        for modem in modems:
+            current.update(modem._devices.values())
+        for root in list(self._fragments.keys()):
+            if root not in current:
+                del self._fragments[root]
+
+    def _write(self, snapshot):
+        start_time = time.time()
+        generation, json_string = snapshot
+        data = json_string.encode()
+        with self._write_lock:
+            try:
+                with open(self._temp_path, 'wb') as outfile:
+                    outfile.write(data)
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                if os.path.exists(self._config_path):
+                    os.replace(self._config_path, self._backup_path)
+                os.replace(self._temp_path, self._config_path)
+                _sync_dir(self._config_path)
+            except OSError as err:
+                print('error writing config to file', err)
+                with self._condition:
+                    if self._pending is None:
+                        # Otherwise the newer pending snapshot replaces it
+                        self._failed = snapshot
+                return
+            if generation is not None:
+                self._journal.compacted(generation)
+        self._record_save(time.time() - start_time, len(data))
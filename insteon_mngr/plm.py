@@ -1,12 +1,20 @@
-import serial
+import time
 
 from insteon_mngr.modem import Modem
+from insteon_mngr.socket_transport import TCPTransport
+
+# Ports starting with these are serial bridges reached over tcp
+TCP_PREFIXES = ('tcp://', 'socket://')
+# Seconds to wait before reopening a lost serial port, doubled on each
+# failure up to REOPEN_MAX
+REOPEN_MIN = 1
+REOPEN_MAX = 60
 
 
 class PLM(Modem):
 
     def __init__(self, core, **kwargs):
-        super().__init__(core, self, **kwargs)
+        super().__init__(core, **kwargs)
         self.set_ack_time(75)
         self.attribute('type', 'plm')
         port = ''
@@ -17,9 +25,28 @@ class PLM(Modem):
         else:
             print('you need to define a port for this plm')
         self.attribute('port', port)
+        self._serial = None
+        self._transport = None
+        self._next_open_time = 0
+        self._reopen_delay = REOPEN_MIN
+        if port.startswith(TCP_PREFIXES):
+            # A network serial bridge, such as ser2net, in raw mode
+            host, tcp_port = port.split('://', 1)[1].rsplit(':', 1)
+            self._transport = TCPTransport(
+                host, tcp_port, on_connect=self._port_reconnected,
+                on_disconnect=self._port_lost)
+        else:
+            self._open_serial()
+        self._setup()
+
+    def _open_serial(self):
+        '''Opens the serial port, returns True on success.  On a failure
+        the next attempt is scheduled with an exponential backoff.'''
+        # Only needed for a local serial port, so imported on first use
+        import serial
         try:
             self._serial = serial.Serial(
-                port=port,
+                port=self.port,
                 baudrate=19200,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
@@ -27,19 +54,82 @@ class PLM(Modem):
                 timeout=0
             )
         except serial.serialutil.SerialException:
-            print('unable to connect to port', port)
+            print('unable to connect to port', self.port)
             self.port_active = False
-        self._setup()
+            self._next_open_time = time.time() + self._reopen_delay
+            self._reopen_delay = min(self._reopen_delay * 2, REOPEN_MAX)
+        else:
+            self.port_active = True
+            self._reopen_delay = REOPEN_MIN
+        return self.port_active
+
+    def _check_serial(self):
+        '''Tries to reopen a lost serial port once its backoff has passed'''
+        if not self.port_active and time.time() >= self._next_open_time:
+            if self._open_serial():
+                print('reopened port', self.port)
+                self._port_reconnected()
+
+    def _serial_lost(self, err):
+        print('lost connection to port', self.port, err)
+        try:
+            self._serial.close()
+        except OSError:
+            # Includes SerialException
+            pass
+        self._serial = None
+        self.port_active = False
+        self._next_open_time = time.time() + self._reopen_delay
+        self._port_lost()
 
     @property
     def port(self):
         return self.attribute('port')
 
+    @property
+    def transport(self):
+        '''The TCPTransport if the PLM is on a network serial bridge,
+        otherwise None'''
+        return self._transport
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+        elif self._serial is not None:
+            try:
+                self._serial.close()
+            except OSError:
+                # Includes SerialException
+                pass
+            self._serial = None
+            self.port_active = False
+
+    def _is_port_ready(self):
+        ret = self.port_active
+        if self._transport is not None:
+            ret = self._transport.connected
+        return ret
+
     def _read_from_port(self):
         '''Reads bytes from PLM and loads them into a buffer'''
+        if self._transport is not None:
+            self._read_buffer.extend(self._transport.read())
+            return
+        self._check_serial()
         if self.port_active:
-            while self._serial.inWaiting() > 0:
-                self._read_buffer.extend(self._serial.read())
+            try:
+                waiting = self._serial.inWaiting()
+                if waiting > 0:
+                    self._read_buffer.extend(self._serial.read(waiting))
+            except OSError as err:
+                self._serial_lost(err)
 
     def _write_to_port(self, msg):
-        self._serial.write(msg)
+        if self._transport is not None:
+            self._transport.write(msg)
+            return
+        try:
+            self._serial.write(msg)
+        except OSError as err:
+            # The message is resent once the port is reopened
+            self._serial_lost(err)
@@ -15,6 +15,7 @@ class PLM_Message(object):
         self._allow_trigger = True
         self._seq_time = 0
         self._seq_lock = False
+        self._scene_tracker = None
         self._is_incomming = False
         self._plm_retry = 0
         self._failed = False
@@ -288,6 +289,15 @@ class PLM_Message(object):
     def seq_time(self, int_parm):
         self._seq_time = int_parm
 
+    @property
+    def scene_tracker(self):
+        '''The SceneTracker following the responders of an all_link_send'''
+        return self._scene_tracker
+
+    @scene_tracker.setter
+    def scene_tracker(self, tracker):
+        self._scene_tracker = tracker
+
     @property
     def plm_success_callback(self):
         '''Function to run on successful plm ack'''
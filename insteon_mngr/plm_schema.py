@@ -17,7 +17,9 @@ must be defined
                         obj = is the plm object that received the message
                         msg = the message object
                         This function is the nack action that should be
-                        performed on the arrival of a nack response
+                        performed on the arrival of a nack response.
+                        Without it a nack means the modem is busy and the
+                        send rate is reduced
         'bad_cmd_act' : function (obj, msg)
                         obj = is the plm object that received the message
                         msg = the message object
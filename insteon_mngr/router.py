@@ -0,0 +1,157 @@
+'''The Router class, which picks the modem used to send messages to each
+device.'''
+import weakref
+
+# Weight given to the newest result in the success rate of a route
+SUCCESS_WEIGHT = .25
+# Success rate assumed for a modem which has not sent to a device yet
+UNTRIED_SUCCESS = .5
+# Success rate given up for each hop needed to reach a device
+HOP_PENALTY = .1
+
+
+class Router(object):
+    '''Tracks how well each modem reaches each device.  Messages to a device
+    are sent through the ready modem with the best recent success rate, less
+    a penalty for each hop used.  The device's own modem starts out fully
+    trusted and wins ties.  Another modem is only used if the device has a
+    link to it, as i2cs devices ignore modems they are not linked to.
+
+    If a message fails on one modem it is handed to the best modem which has
+    not tried it yet.
+
+    The modems linked to each device are cached, and forgotten when the
+    ALDB of the device changes.'''
+    def __init__(self, core):
+        self._core = core
+        self._routes = {}
+        self._linked_modems = weakref.WeakKeyDictionary()
+        self._last_modem = {}
+        self._tried = weakref.WeakKeyDictionary()
+
+    def get_modem(self, device):
+        '''Returns the modem that the next message to device should be sent
+        through.  If no modem is ready this is the device's own modem.'''
+        if len(self._core.get_all_modems()) < 2:
+            return device.plm
+        exclude = ()
+        if len(device.out_queue) > 0:
+            exclude = self._tried.get(device.out_queue[0], ())
+        ret = self._choose(device, exclude)
+        if ret is None and len(exclude) > 0:
+            ret = self._choose(device, ())
+        if ret is None:
+            ret = device.plm
+        return ret
+
+    def get_routes(self, device):
+        '''Returns a dict of the success rate and hops of each modem which
+        has sent to or heard from device, keyed by the modem address'''
+        ret = {}
+        for (dev_addr, modem), route in self._routes.items():
+            if dev_addr == device.dev_addr_str:
+                ret[modem.dev_addr_str] = route.copy()
+        return ret
+
+    def get_sending_modem(self, msg):
+        '''Returns the modem which sent the message that msg, a direct ack
+        heard by any modem, is answering.  Acks are addressed to the modem
+        which sent the message, which is not always the modem which heard
+        the ack.'''
+        ret = msg.plm
+        to_addr = msg.insteon_msg.to_addr_str
+        for modem in self._core.get_all_modems():
+            if modem.dev_addr_str == to_addr:
+                ret = modem
+                break
+        return ret
+
+    def aldb_changed(self, device):
+        '''Called when a record in the ALDB of device changes'''
+        self._linked_modems.pop(device, None)
+
+    def msg_sent(self, device, modem, msg):
+        '''Called by a modem when it sends a message to device'''
+        self._last_modem[device.dev_addr_str] = modem
+        if msg not in self._tried:
+            self._tried[msg] = set()
+        self._tried[msg].add(modem)
+
+    def msg_rcvd(self, device, modem, msg):
+        '''Called by a modem for every copy of a message it hears from
+        device, including duplicates heard by other modems'''
+        insteon_msg = msg.insteon_msg
+        if insteon_msg.message_type in ('direct', 'direct_ack',
+                                        'direct_nack'):
+            hops_used = insteon_msg.max_hops - insteon_msg.hops_left
+            route = self._get_route(device, modem)
+            route['hops'] = ((route['hops'] * (1 - SUCCESS_WEIGHT)) +
+                             (hops_used * SUCCESS_WEIGHT))
+        if (msg.allow_trigger and
+                insteon_msg.message_type in ('direct_ack', 'direct_nack')):
+            sender = self._last_modem.get(device.dev_addr_str)
+            if sender is not None:
+                self._update_success(device, sender, 1)
+
+    def failover(self, msg, modem):
+        '''Called when a message to a device ran out of retries on modem.
+        Returns True if another modem will try the message.'''
+        self._update_success(msg.device, modem, 0)
+        tried = self._tried.get(msg, set())
+        ret = self._choose(msg.device, tried) is not None
+        if ret:
+            print('routing message for', msg.device.dev_addr_str,
+                  'through another modem')
+        return ret
+
+    def _choose(self, device, exclude):
+        ret = None
+        best_score = None
+        for modem in self._core.get_all_modems():
+            if (modem in exclude or
+                    not modem._is_port_ready() or
+                    not self._can_reach(device, modem)):
+                continue
+            score = self._get_score(device, modem)
+            if (best_score is None or score > best_score or
+                    (score == best_score and modem is device.plm)):
+                best_score = score
+                ret = modem
+        return ret
+
+    def _can_reach(self, device, modem):
+        ret = modem is device.plm
+        if not ret:
+            linked = self._linked_modems.get(device)
+            if linked is None:
+                linked = set()
+                for record in list(device.aldb.aldb.values()):
+                    if record.parse_record()['in_use']:
+                        linked.add(record.get_linked_device_str())
+                self._linked_modems[device] = linked
+            ret = modem.dev_addr_str in linked
+        return ret
+
+    def _get_score(self, device, modem):
+        route = self._routes.get((device.dev_addr_str, modem))
+        if route is None:
+            route = self._new_route(device, modem)
+        return route['success'] - (route['hops'] * HOP_PENALTY)
+
+    def _get_route(self, device, modem):
+        key = (device.dev_addr_str, modem)
+        if key not in self._routes:
+            self._routes[key] = self._new_route(device, modem)
+        return self._routes[key]
+
+    def _new_route(self, device, modem):
+        if modem is device.plm:
+            route = {'success': 1.0, 'hops': device.smart_hops}
+        else:
+            route = {'success': UNTRIED_SUCCESS, 'hops': 3}
+        return route
+
+    def _update_success(self, device, modem, result):
+        route = self._get_route(device, modem)
+        route['success'] = ((route['success'] * (1 - SUCCESS_WEIGHT)) +
+                            (result * SUCCESS_WEIGHT))
@@ -0,0 +1,69 @@
+'''The SceneMap class, a precomputed index of the responders linked to each
+controller group.'''
+from insteon_mngr import BYTE_TO_ID
+
+
+class SceneMap(object):
+    '''Maps a (controller address, group) tuple to the responder groups that
+    are linked to it, along with their on levels and ramp rates.  The map is
+    built from the responder records of every ALDB.  An ALDB marks itself as
+    dirty when it changes and only the dirty ALDBs are indexed again on the
+    next lookup.'''
+    def __init__(self):
+        self._map = {}
+        self._contributions = {}
+        self._dirty = set()
+
+    def mark_dirty(self, aldb):
+        '''Called by an ALDB whenever one of its records changes'''
+        self._dirty.add(aldb)
+
+    def remove_aldb(self, aldb):
+        '''Removes all of the entries generated from this ALDB, used when a
+        device is deleted'''
+        self._dirty.discard(aldb)
+        self._remove(aldb)
+
+    def get_members(self, controller_id, group):
+        '''Returns a list of dicts describing each responder to the
+        controller_id and group.  Each dict contains the device, the
+        group_number of the responder and the on_level and ramp_rate'''
+        self._update()
+        return self._map.get((controller_id.upper(), group), [])
+
+    def _update(self):
+        while len(self._dirty) > 0:
+            aldb = self._dirty.pop()
+            self._remove(aldb)
+            self._index(aldb)
+
+    def _remove(self, aldb):
+        for key in self._contributions.pop(aldb, ()):
+            members = [member for member in self._map[key]
+                       if member['device'] is not aldb.device]
+            if len(members) > 0:
+                self._map[key] = members
+            else:
+                del self._map[key]
+
+    def _index(self, aldb):
+        keys = []
+        for record in list(aldb.aldb.values()):
+            parsed = record.parse_record()
+            if not parsed['in_use'] or not parsed['responder']:
+                continue
+            key = (BYTE_TO_ID(parsed['dev_addr_hi'],
+                              parsed['dev_addr_mid'],
+                              parsed['dev_addr_low']),
+                   parsed['group'])
+            if key not in self._map:
+                self._map[key] = []
+            self._map[key].append({
+                'device': aldb.device,
+                'group_number': parsed['data_3'],
+                'on_level': parsed['data_1'],
+                'ramp_rate': parsed['data_2']
+            })
+            if key not in keys:
+                keys.append(key)
+        self._contributions[aldb] = keys
@@ -0,0 +1,110 @@
+'''The SceneTracker class, which follows the cleanup acks of the responders to
+a scene command sent by the modem.'''
+import time
+
+
+class SceneTracker(object):
+    '''Tracks each responder of a modem scene command.  The responders are
+    taken from the controller records of the modem group.  Once every
+    responder has either acked the cleanup or been reported as failed by the
+    modem, the sequence lock on the modem is released.'''
+    def __init__(self, group, records):
+        self._group = group
+        self._message = None
+        self._pending = []
+        self._acked = []
+        self._failed = []
+        self._complete_time = None
+        self._released_early = False
+        for record in records:
+            device_id = record.get_linked_device_str()
+            if device_id not in self._pending:
+                self._pending.append(device_id)
+
+    @property
+    def group(self):
+        return self._group
+
+    @property
+    def message(self):
+        '''The all_link_send message being tracked'''
+        return self._message
+
+    @message.setter
+    def message(self, msg):
+        self._message = msg
+
+    @property
+    def is_complete(self):
+        '''Returns true once every responder has been resolved or the modem
+        has reported the cleanup status'''
+        return self._complete_time is not None
+
+    @property
+    def released_early(self):
+        '''Returns true if the sequence lock was released before the modem
+        reported the cleanup status'''
+        return self._released_early
+
+    @property
+    def completion_time(self):
+        '''Returns the seconds between sending the scene command and
+        resolving the last responder, None if not complete'''
+        ret = None
+        if self.is_complete and self._message.time_sent:
+            ret = self._complete_time - self._message.time_sent
+        return ret
+
+    @property
+    def failed_members(self):
+        '''Returns a list of the device ids which failed to ack the scene'''
+        return self._failed.copy()
+
+    def responder_acked(self, device_id):
+        '''Called when a cleanup ack is received from a responder'''
+        if device_id in self._pending:
+            self._pending.remove(device_id)
+            self._acked.append(device_id)
+            self._check_complete()
+
+    def responder_failed(self, device_id):
+        '''Called when the modem reports that a responder failed to ack'''
+        if device_id in self._pending:
+            self._pending.remove(device_id)
+            self._failed.append(device_id)
+            self._check_complete()
+
+    def status_rcvd(self):
+        '''Called when the modem reports the cleanup status.'''
+        if not self.is_complete:
+            self._complete_time = time.time()
+            self._print_report()
+
+    def _check_complete(self):
+        if len(self._pending) == 0 and not self.is_complete:
+            self._complete_time = time.time()
+            if self._message.seq_lock:
+                # Every responder has answered, nothing is left for the
+                # modem to clean up
+                self._message.seq_lock = False
+                self._message.plm_ack = True
+                self._released_early = True
+            self._print_report()
+
+    def _print_report(self):
+        completion_time = self.completion_time
+        if completion_time is not None:
+            completion_time = round(completion_time, 3)
+        print('Scene', self._group.group_number, 'complete in',
+              completion_time, 'seconds, failed members', self._failed)
+
+    def report(self):
+        '''Returns a dict describing the outcome of the scene command'''
+        return {
+            'group': self._group.group_number,
+            'complete': self.is_complete,
+            'completion_time': self.completion_time,
+            'acked': self._acked.copy(),
+            'failed': self._failed.copy(),
+            'pending': self._pending.copy()
+        }
@@ -1,5 +1,6 @@
 from insteon_mngr.sequences.i1_device import ScanDeviceALDBi1, WriteALDBRecordi1
-from insteon_mngr.sequences.i2_device import ScanDeviceALDBi2, WriteALDBRecordi2
+from insteon_mngr.sequences.i2_device import (ScanDeviceALDBi2,
+    VerifyDeviceALDBi2, WriteALDBRecordi2)
 from insteon_mngr.sequences.common import (StatusRequest, WriteALDBRecord,
     SetALDBDelta, AddPLMtoDevice, InitializeDevice)
 from insteon_mngr.sequences.modem import WriteALDBRecordModem
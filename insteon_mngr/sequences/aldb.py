@@ -56,6 +56,9 @@ class _ALDBSequence(BaseSequence):
 
     def _startup(self):
         self._running = True
+        if self._device.aldb.is_trusted():
+            self._step_complete()
+            return
         status_sequence = StatusRequest(group=self._device.base_group)
         status_sequence.add_success_callback(self._step_complete)
         status_sequence.add_failure_callback(self._step_failure)
@@ -75,11 +75,19 @@ class StatusRequest(BaseSequence):
         base_group = self._group.device.get_object_by_group_num(self._group.device.base_group_number)
         base_group.set_cached_state(msg.get_byte_by_name('cmd_2'))
         aldb_delta = msg.get_byte_by_name('cmd_1')
-        if self._group.device.attribute('aldb_delta') != aldb_delta:
-            print('aldb has changed, rescanning')
-            self._group.device.query_aldb(success=self._on_success,
-                                          failure=self._on_failure)
+        cached_delta = self._group.device.attribute('aldb_delta')
+        if cached_delta != aldb_delta:
+            print('aldb has changed, verifying')
+            changes = None
+            if cached_delta is not None:
+                changes = (aldb_delta - cached_delta) % 0x100
+            self._group.device.send_handler.verify_aldb(
+                changes=changes,
+                success=self._on_success,
+                failure=self._on_failure)
         else:
+            # Records the time that the cache was verified
+            self._group.device.set_aldb_delta(aldb_delta)
             self._on_success()
 
 
@@ -344,10 +352,14 @@ class InitializeDevice(BaseSequence):
             }
             trigger = InsteonTrigger(device=self._device,
                                      attributes=trigger_attributes)
-            trigger.trigger_function = lambda: self._device.send_handler.get_status()
+            trigger.trigger_function = lambda: self._init_step_3()
             trigger.name = self._device.dev_addr_str + 'init_step_2'
             trigger.queue()
             self._device.send_handler.get_device_version()
         else:
-            # TODO this is really only necessary to check aldb delta
-            self._device.send_handler.get_status()
+            self._init_step_3()
+
+    def _init_step_3(self):
+        # TODO this is really only necessary to check aldb delta
+        self._device.send_handler.get_status(success=self._on_success,
+                                             failure=self._on_failure)
@@ -14,6 +14,7 @@ class ScanDeviceALDBi2(BaseSequence):
         dev_bytes = {'msb': 0x00, 'lsb': 0x00}
         message = self._device.create_message('read_aldb')
         message.insert_bytes_into_raw(dev_bytes)
+        message.msg_failure_callback = lambda: self._on_failure()
         self._device.queue_device_msg(message)
         # It would be nice to link the trigger to the msb and lsb, but we
         # don't technically have that yet at this point
@@ -38,7 +39,8 @@ class ScanDeviceALDBi2(BaseSequence):
             aldb_sequence.start()
         else:
             dev_bytes = self._device.aldb.get_next_aldb_address(msb, lsb)
-            self._device.send_handler.i2_get_aldb(dev_bytes)
+            self._device.send_handler.i2_get_aldb(
+                dev_bytes, failure=lambda: self._on_failure())
             trigger_attributes = {
                 'usr_3': dev_bytes['msb'],
                 'usr_4': dev_bytes['lsb'],
@@ -53,6 +55,100 @@ class ScanDeviceALDBi2(BaseSequence):
             trigger.queue()
 
 
+class VerifyDeviceALDBi2(BaseSequence):
+    '''Used when the aldb_delta of an i2 device no longer matches the cache.
+    Rather than clearing the cache and reading every record, each record is
+    read and compared with the cache, and patched if it differs.  Records
+    which are not in use in the cache, and the end of the database, are read
+    first as that is where new links are written.
+
+    Each write to the ALDB moves the delta on by one, so changes is the
+    number of records which can differ.  Once that many records have been
+    patched, and the new end of the database has been read, the scan stops.
+    If changes is None, or fewer records differ, every record is read.
+
+    A record which the device does not return, after the modem has given up
+    retrying it, leaves the cache half patched, so the aldb is rescanned
+    from scratch.'''
+    def __init__(self, device=None, changes=None):
+        super().__init__()
+        self._device = device
+        self._changes = changes
+        self._patched = 0
+        self._pending = []
+        self._end_keys = set()
+        self._read = set()
+        self._before = None
+
+    def start(self):
+        aldb = self._device.aldb.aldb
+        keys = sorted(aldb.keys(), reverse=True)
+        self._pending = [key for key in keys if aldb[key].is_empty_aldb()]
+        self._pending.extend([key for key in keys
+                              if key not in self._pending])
+        self._next_record()
+
+    def _next_record(self):
+        if (len(self._pending) == 0 or
+                (self._changes is not None and
+                 self._patched >= self._changes and
+                 self._pending[0] not in self._end_keys)):
+            print('verified aldb of', self._device.dev_addr_str, 'read',
+                  len(self._read), 'records, patched', self._patched)
+            aldb_sequence = SetALDBDelta(group=self._device.base_group)
+            aldb_sequence.add_success_callback(lambda: self._on_success())
+            aldb_sequence.add_failure_callback(lambda: self._on_failure())
+            aldb_sequence.start()
+            return
+        key = self._pending.pop(0)
+        self._read.add(key)
+        self._before = bytes(self._device.aldb.get_record(key).raw)
+        msb = int(key[0:2], 16)
+        lsb = int(key[2:4], 16)
+        self._device.send_handler.i2_get_aldb(
+            {'msb': msb, 'lsb': lsb}, failure=lambda: self._read_failed(key))
+        trigger_attributes = {
+            'usr_3': msb,
+            'usr_4': lsb,
+            'msg_type': 'direct'
+        }
+        # pylint: disable=W0108
+        trigger = InsteonTrigger(device=self._device,
+                                 command_name='read_aldb',
+                                 attributes=trigger_attributes)
+        trigger.trigger_function = lambda: self._record_read(key, msb, lsb)
+        trigger.name = self._device.dev_addr_str + 'query_aldb'
+        trigger.queue()
+
+    def _record_read(self, key, msb, lsb):
+        record = self._device.aldb.get_record(key)
+        if bytes(record.raw) != self._before:
+            self._patched += 1
+            print('patched aldb record', key)
+        if not record.is_last_aldb():
+            # The end of the database may have moved down
+            dev_bytes = self._device.aldb.get_next_aldb_address(msb, lsb)
+            next_key = self._device.aldb.get_aldb_key(dev_bytes['msb'],
+                                                      dev_bytes['lsb'])
+            if (next_key not in self._read and
+                    next_key not in self._device.aldb.aldb):
+                self._end_keys.add(next_key)
+                self._pending.insert(0, next_key)
+        self._next_record()
+
+    def _read_failed(self, key):
+        if self.is_complete:
+            return
+        print('unable to read aldb record', key, 'of',
+              self._device.dev_addr_str, 'rescanning')
+        # The rescan replaces the trigger of the failed read, which has the
+        # same name
+        scan_object = ScanDeviceALDBi2(device=self._device)
+        scan_object.add_success_callback(lambda: self._on_success())
+        scan_object.add_failure_callback(lambda: self._on_failure())
+        scan_object.start()
+
+
 class WriteALDBRecordi2(WriteALDBRecord):
     def _perform_write(self):
         super()._perform_write()
@@ -0,0 +1,160 @@
+'''The TCPTransport class, a reconnecting non-blocking TCP byte stream used
+by modems which are reached over the network.'''
+import errno
+import select
+import socket
+import time
+
+# Seconds allowed for a connection attempt to complete
+CONNECT_TIMEOUT = 5
+# Seconds to wait before retrying a failed connection, doubled on each
+# failure up to RECONNECT_MAX
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+
+
+class TCPTransport(object):
+    '''A byte stream to host and port.  Nothing blocks, both read and write
+    return immediately and are meant to be called from the core loop.  If the
+    connection drops it is reopened on the next call, with an exponential
+    backoff between failed attempts.  on_connect, if passed, is called each
+    time a connection is established and is expected to resend anything
+    which was in flight, so anything left in the send buffer is dropped.
+    on_disconnect, if passed, is called when an established connection is
+    lost.'''
+    def __init__(self, host, port, on_connect=None, on_disconnect=None):
+        self.host = host
+        self.port = int(port)
+        self._on_connect = on_connect
+        self._on_disconnect = on_disconnect
+        self._socket = None
+        self._connecting = False
+        self._connect_start = 0
+        self._next_connect_time = 0
+        self._reconnect_delay = RECONNECT_MIN
+        self._send_buffer = bytearray()
+        self._connects = 0
+        self._disconnects = 0
+
+    @property
+    def connected(self):
+        return self._socket is not None and not self._connecting
+
+    @property
+    def connects(self):
+        '''The number of times a connection has been established'''
+        return self._connects
+
+    @property
+    def disconnects(self):
+        '''The number of times an established connection was lost'''
+        return self._disconnects
+
+    def read(self):
+        '''Returns a bytearray of the bytes which have arrived, connecting
+        first if necessary'''
+        ret = bytearray()
+        if not self._connect():
+            return ret
+        while self._socket is not None:
+            try:
+                data = self._socket.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as err:
+                self._disconnected(err)
+                break
+            if not data:
+                self._disconnected('closed by remote end')
+                break
+            ret.extend(data)
+        self._flush()
+        return ret
+
+    def write(self, data):
+        '''Queues data to be sent, it is held while a connection attempt is
+        in progress.  Data written while disconnected is dropped, the modem
+        resends messages which are not acked.'''
+        self._connect()
+        if self._socket is not None:
+            self._send_buffer.extend(data)
+            self._flush()
+        else:
+            print('not connected to', self.host, 'dropping', len(data),
+                  'bytes')
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+        self._socket = None
+        self._connecting = False
+        self._send_buffer = bytearray()
+
+    def _connect(self):
+        '''Returns True if connected, otherwise starts or checks on a
+        connection attempt'''
+        if self._socket is None:
+            if time.time() < self._next_connect_time:
+                return False
+            self._start_connect()
+        if self._connecting:
+            self._check_connect()
+        return self.connected
+
+    def _start_connect(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setblocking(False)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._connecting = True
+        self._connect_start = time.time()
+        try:
+            result = self._socket.connect_ex((self.host, self.port))
+        except OSError as err:
+            self._connect_failed(err)
+            return
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK,
+                          errno.EALREADY):
+            self._connect_failed(errno.errorcode.get(result, result))
+
+    def _check_connect(self):
+        _, writable, _ = select.select([], [self._socket], [], 0)
+        if writable:
+            result = self._socket.getsockopt(socket.SOL_SOCKET,
+                                             socket.SO_ERROR)
+            if result != 0:
+                self._connect_failed(errno.errorcode.get(result, result))
+                return
+            self._connecting = False
+            self._reconnect_delay = RECONNECT_MIN
+            self._connects += 1
+            print('connected to', self.host, 'port', self.port)
+            if self._on_connect is not None:
+                self._send_buffer = bytearray()
+                self._on_connect()
+        elif time.time() - self._connect_start > CONNECT_TIMEOUT:
+            self._connect_failed('timed out')
+
+    def _connect_failed(self, reason):
+        print('unable to connect to', self.host, 'port', self.port, reason)
+        self.close()
+        self._next_connect_time = time.time() + self._reconnect_delay
+        self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX)
+
+    def _disconnected(self, reason):
+        print('lost connection to', self.host, 'port', self.port, reason)
+        self._disconnects += 1
+        self.close()
+        self._next_connect_time = time.time() + RECONNECT_MIN
+        if self._on_disconnect is not None:
+            self._on_disconnect()
+
+    def _flush(self):
+        while self.connected and len(self._send_buffer) > 0:
+            try:
+                sent = self._socket.send(self._send_buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as err:
+                self._disconnected(err)
+                break
+            del self._send_buffer[0:sent]
@@ -0,0 +1,294 @@
+'''The SQLiteStore class, which saves the state of the network to a sqlite
+database.'''
+import json
+import sqlite3
+import time
+
+from insteon_mngr.aldb import decode_records
+from insteon_mngr.persistence import BaseStore
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS modems (address TEXT PRIMARY KEY)',
+    'CREATE TABLE IF NOT EXISTS devices ('
+    'address TEXT PRIMARY KEY, modem TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS attributes ('
+    'owner TEXT, name TEXT, value TEXT, PRIMARY KEY (owner, name))',
+    'CREATE TABLE IF NOT EXISTS groups ('
+    'owner TEXT, group_number INTEGER, attributes TEXT, '
+    'PRIMARY KEY (owner, group_number))',
+    'CREATE TABLE IF NOT EXISTS aldb_records ('
+    'owner TEXT, key TEXT, record BLOB, PRIMARY KEY (owner, key))',
+    'CREATE TABLE IF NOT EXISTS user_links ('
+    'owner TEXT, controller TEXT, group_number INTEGER, position INTEGER, '
+    'data TEXT, PRIMARY KEY (owner, controller, group_number, position))',
+)
+
+# The key and value columns of each table holding the state of a device
+TABLES = {
+    'attributes': (('name',), 'value'),
+    'groups': (('group_number',), 'attributes'),
+    'aldb_records': (('key',), 'record'),
+    'user_links': (('controller', 'group_number', 'position'), 'data')
+}
+
+
+def _get_rows(data):
+    '''Splits the saved form of a device into a dict of the rows of each
+    table, keyed by the key columns of the row'''
+    rows = {table: {} for table in TABLES}
+    for name, value in data.items():
+        if name not in ('aldb', 'groups', 'user_links', 'devices'):
+            rows['attributes'][(name,)] = json.dumps(value, sort_keys=True)
+    aldb = data.get('aldb', {})
+    if isinstance(aldb, str):
+        for key, raw in decode_records(aldb).items():
+            rows['aldb_records'][(key,)] = bytes(raw)
+    else:
+        for key, record in aldb.items():
+            rows['aldb_records'][(key,)] = bytes.fromhex(record)
+    for number, attributes in data.get('groups', {}).items():
+        rows['groups'][(int(number),)] = json.dumps(attributes,
+                                                    sort_keys=True)
+    for controller, groups in data.get('user_links', {}).items():
+        for number, links in groups.items():
+            for position, link in enumerate(links):
+                rows['user_links'][(controller, int(number), position)] = \
+                    json.dumps(link, sort_keys=True)
+    return rows
+
+
+def _get_data(rows):
+    '''The reverse of _get_rows'''
+    data = {'aldb': {}, 'groups': {}, 'user_links': {}}
+    for (name,), value in rows['attributes'].items():
+        data[name] = json.loads(value)
+    for (key,), record in rows['aldb_records'].items():
+        data['aldb'][key] = bytes(record).hex().upper()
+    for (number,), attributes in rows['groups'].items():
+        data['groups'][number] = json.loads(attributes)
+    for (controller, number, position), link in \
+            sorted(rows['user_links'].items()):
+        links = data['user_links'].setdefault(controller, {})
+        links.setdefault(number, []).append(json.loads(link))
+    return data
+
+
+def _diff_rows(owner, old_rows, new_rows):
+    '''Returns the statements which turn old_rows into new_rows'''
+    ops = []
+    for table, (key_columns, value_column) in TABLES.items():
+        old = old_rows[table]
+        new = new_rows[table]
+        columns = ('owner',) + key_columns + (value_column,)
+        upsert = ('INSERT OR REPLACE INTO ' + table + ' (' +
+                  ', '.join(columns) + ') VALUES (' +
+                  ', '.join('?' * len(columns)) + ')')
+        delete = ('DELETE FROM ' + table + ' WHERE owner = ?' +
+                  ''.join(' AND ' + column + ' = ?'
+                          for column in key_columns))
+        for key, value in new.items():
+            if old.get(key) != value:
+                ops.append((upsert, (owner,) + key + (value,)))
+        for key in old.keys() - new.keys():
+            ops.append((delete, (owner,) + key))
+    return ops
+
+
+def _empty_rows():
+    return {table: {} for table in TABLES}
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def migrate_json(json_path, db_path):
+    '''Copies the state saved in a config.json file into a sqlite database,
+    replacing anything already saved there for the same devices'''
+    with open(json_path, 'r') as infile:
+        read_data = json.loads(infile.read())
+    conn = _connect(db_path)
+    with conn:
+        for modem_id, modem_data in read_data.get('modems', {}).items():
+            conn.execute('INSERT OR REPLACE INTO modems (address) VALUES (?)',
+                         (modem_id,))
+            for sql, params in _diff_rows(modem_id, _empty_rows(),
+                                          _get_rows(modem_data)):
+                conn.execute(sql, params)
+            for dev_id, dev_data in modem_data.get('devices', {}).items():
+                conn.execute('INSERT OR REPLACE INTO devices (address, modem) '
+                             'VALUES (?, ?)', (dev_id, modem_id))
+                for sql, params in _diff_rows(dev_id, _empty_rows(),
+                                              _get_rows(dev_data)):
+                    conn.execute(sql, params)
+    conn.close()
+    print('migrated', json_path, 'to', db_path)
+
+
+class SQLiteStore(BaseStore):
+    '''Saves the modems and devices to a sqlite database with a table for
+    each of modems, devices, attributes, groups, ALDB records and user
+    links.  The rows last saved for each device are kept, so a save only
+    upserts or deletes the rows which changed, in a single transaction.
+
+    If lazy is True only the modems are loaded at startup, each device is
+    loaded the first time it is used.  Until a device is loaded its links
+    are not in the scene map, so the states of its groups are not updated by
+    scene commands.'''
+    def __init__(self, db_path, lazy=False, save_interval=60):
+        self._db_path = db_path
+        self.lazy = lazy
+        self._rows = {}
+        self._saved_modems = set()
+        self._device_modem = {}
+        # Statements of a write which failed, retried with the next save
+        self._failed = None
+        self._conn = _connect(db_path)
+        super().__init__(save_interval)
+
+    def load(self):
+        '''Returns the saved state in the same form as the json config.
+        When loading lazily, the devices are listed with None in place of
+        their attributes.'''
+        modems = {}
+        rows = None
+        if not self.lazy:
+            rows = self._select_all()
+        with self._write_lock:
+            modem_rows = self._conn.execute(
+                'SELECT address FROM modems').fetchall()
+            device_rows = self._conn.execute(
+                'SELECT address, modem FROM devices').fetchall()
+        for (address,) in modem_rows:
+            self._saved_modems.add(address)
+            modems[address] = self._load_owner(address, rows)
+            modems[address]['devices'] = {}
+        for address, modem in device_rows:
+            self._device_modem[address] = modem
+            if modem not in modems:
+                continue
+            device_data = None
+            if not self.lazy:
+                device_data = self._load_owner(address, rows)
+            modems[modem]['devices'][address] = device_data
+        return {'modems': modems}
+
+    def load_device(self, address):
+        return self._load_owner(address)
+
+    def close(self):
+        super().close()
+        with self._write_lock:
+            self._conn.close()
+
+    def _select_all(self):
+        rows = {}
+        for table, (key_columns, value_column) in TABLES.items():
+            columns = ('owner',) + key_columns + (value_column,)
+            with self._write_lock:
+                table_rows = self._conn.execute(
+                    'SELECT ' + ', '.join(columns) + ' FROM ' + table
+                ).fetchall()
+            for row in table_rows:
+                owner_rows = rows.setdefault(row[0], _empty_rows())
+                owner_rows[table][tuple(row[1:-1])] = row[-1]
+        return rows
+
+    def _load_owner(self, owner, rows=None):
+        if rows is None:
+            owner_rows = _empty_rows()
+            # The connection is shared with the writer thread, which may be
+            # in the middle of a transaction
+            with self._write_lock:
+                for table, (key_columns, value_column) in TABLES.items():
+                    for row in self._conn.execute(
+                            'SELECT ' +
+                            ', '.join(key_columns + (value_column,)) +
+                            ' FROM ' + table + ' WHERE owner = ?', (owner,)):
+                        owner_rows[table][tuple(row[:-1])] = row[-1]
+        else:
+            owner_rows = rows.get(owner, _empty_rows())
+        for table in TABLES:
+            for key, value in owner_rows[table].items():
+                if isinstance(value, memoryview):
+                    owner_rows[table][key] = bytes(value)
+        self._rows[owner] = owner_rows
+        return _get_data(owner_rows)
+
+    def _snapshot(self, modems, dirty):
+        '''Returns a tuple of the statements needed to save the changes'''
+        ops = []
+        current_modems = set()
+        current_devices = {}
+        for modem in modems:
+            modem_id = modem.dev_addr_str
+            current_modems.add(modem_id)
+            if modem_id not in self._saved_modems:
+                ops.append(('INSERT OR REPLACE INTO modems (address) '
+                            'VALUES (?)', (modem_id,)))
+            addresses = list(modem._devices.keys())
+            addresses.extend(modem._unloaded_devices)
+            for address in addresses:
+                current_devices[address] = modem_id
+                if self._device_modem.get(address) != modem_id:
+                    ops.append(('INSERT OR REPLACE INTO devices '
+                                '(address, modem) VALUES (?, ?)',
+                                (address, modem_id)))
+            for root in [modem] + list(modem._devices.values()):
+                owner = root.dev_addr_str
+                if root in dirty or owner not in self._rows:
+                    new_rows = _get_rows(self._serialize(root))
+                    ops.extend(_diff_rows(
+                        owner, self._rows.get(owner, _empty_rows()), new_rows))
+                    self._rows[owner] = new_rows
+        for modem_id in self._saved_modems - current_modems:
+            ops.append(('DELETE FROM modems WHERE address = ?', (modem_id,)))
+            ops.extend(self._delete_owner(modem_id))
+        for address in self._device_modem.keys() - current_devices.keys():
+            ops.append(('DELETE FROM devices WHERE address = ?', (address,)))
+            ops.extend(self._delete_owner(address))
+        self._saved_modems = current_modems
+        self._device_modem = current_devices
+        return tuple(ops)
+
+    def _delete_owner(self, owner):
+        self._rows.pop(owner, None)
+        return [('DELETE FROM ' + table + ' WHERE owner = ?', (owner,))
+                for table in TABLES]
+
+    def _has_changes(self):
+        return super()._has_changes() or self._failed is not None
+
+    def _merge_pending(self, pending, snapshot):
+        if pending is not None:
+            snapshot = pending + snapshot
+        if self._failed is not None:
+            snapshot = self._failed + snapshot
+            self._failed = None
+        return snapshot
+
+    def _write(self, ops):
+        start_time = time.time()
+        length = 0
+        with self._write_lock:
+            try:
+                with self._conn:
+                    for sql, params in ops:
+                        self._conn.execute(sql, params)
+                        length += sum(len(param) for param in params
+                                      if isinstance(param, (str, bytes)))
+            except sqlite3.Error as err:
+                print('error writing to', self._db_path, err)
+                # The cached rows already include these changes, so the
+                # statements are kept and written before the next save
+                with self._condition:
+                    if self._failed is not None:
+                        ops = self._failed + ops
+                    self._failed = ops
+                return
+        self._record_save(time.time() - start_time, length)
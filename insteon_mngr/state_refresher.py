@@ -0,0 +1,96 @@
+'''The StateRefresher class, which keeps the cached device states current by
+polling stale devices in the background.'''
+import time
+
+# Approximate airtime in seconds of a standard message making a single hop
+HOP_TIME = 0.05
+
+
+class StateRefresher(object):
+    '''Polls the status of devices whose cached state is older than
+    max_state_age.  Polls are only sent while the modem is connected and
+    idle, and are spaced out so that they use no more than airtime_share of
+    the available airtime.  Devices which have been heard from within
+    passive_time are skipped, as are sleepy devices which cannot be polled.
+    When no device needs a poll, the devices are checked again after
+    recheck_interval seconds.  Whether a modem is idle is only asked once
+    one of its devices is due.'''
+    def __init__(self, core, max_state_age=3600, airtime_share=0.05,
+                 passive_time=300, recheck_interval=10):
+        self._core = core
+        self.max_state_age = max_state_age
+        self.airtime_share = airtime_share
+        self.passive_time = passive_time
+        self.recheck_interval = recheck_interval
+        self._next_poll_time = 0
+        self._last_polled = {}
+        # The stalest device of each modem found by the last check
+        self._due = {}
+
+    def process(self):
+        '''Called by the core loop. Sends at most one status request to the
+        stalest eligible device. Do not call directly.'''
+        now = time.time()
+        if now < self._next_poll_time:
+            return
+        if len(self._due) == 0:
+            for modem in self._core.get_all_modems():
+                device = self._get_stalest_device(modem, now)
+                if device is not None:
+                    self._due[modem] = device
+            if len(self._due) == 0:
+                # Nothing is stale, don't scan the devices on every loop
+                self._next_poll_time = now + self.recheck_interval
+                return
+        for modem, device in list(self._due.items()):
+            if modem._is_port_ready() and modem.is_idle():
+                del self._due[modem]
+                # The device may have been deleted or heard from since
+                if (modem._devices.get(device.dev_addr_str) is device and
+                        self._is_eligible(device, now)):
+                    self._poll(device, now)
+                    return
+
+    def _get_stalest_device(self, modem, now):
+        ret = None
+        oldest_time = now
+        # Only loaded devices, loading the rest would defeat lazy loading
+        for device in list(modem._devices.values()):
+            if not self._is_eligible(device, now):
+                continue
+            state_time = device.base_group.attribute('state_time')
+            if state_time is None:
+                state_time = 0
+            if state_time < oldest_time:
+                oldest_time = state_time
+                ret = device
+        return ret
+
+    def _is_eligible(self, device, now):
+        ret = False
+        if (device.base_group is not None and
+                not device.is_sleepy and
+                hasattr(device.send_handler, 'get_status')):
+            state_age = device.base_group.state_age
+            last_rcvd = device.last_rcvd_msg
+            last_polled = self._last_polled.get(device.dev_addr_str, 0)
+            if state_age is not None and state_age < self.max_state_age:
+                pass
+            elif (last_rcvd is not None and
+                  last_rcvd.creation_time > now - self.passive_time):
+                # Recently confirmed by passive traffic
+                pass
+            elif last_polled > now - self.max_state_age:
+                # Don't repeatedly poll a device that isn't answering
+                pass
+            else:
+                ret = True
+        return ret
+
+    def _poll(self, device, now):
+        print('refreshing stale state of device', device.dev_addr_str)
+        self._last_polled[device.dev_addr_str] = now
+        device.send_handler.get_status()
+        # A status request and its ack each travel every hop
+        airtime = 2 * (device.smart_hops + 1) * HOP_TIME
+        self._next_poll_time = now + (airtime / self.airtime_share)
@@ -113,9 +113,11 @@ class UserLink(object):
 
     def set_controller_key(self, key):
         self._controller_key = key
+        self._device._state_changed('user_links')
 
     def set_responder_key(self, key):
         self._responder_key = key
+        self._device._state_changed('user_links')
 
     def edit(self, controller, data):
         '''Edits the user link'''
@@ -128,6 +130,7 @@ class UserLink(object):
             self._data_1 = data['data_1']
             self._data_2 = data['data_2']
             self._data_3 = data['data_3']
+            self._device._state_changed('user_links')
         self.fix()
 
     def fix(self):
@@ -140,12 +143,12 @@ class UserLink(object):
         responder_sequence = None
         if self._is_controller_correct() is False:
             if self._adoptable_controller_key() is not None:
-                self._controller_key = self._adoptable_controller_key()
+                self.set_controller_key(self._adoptable_controller_key())
             else:
                 controller_sequence = self.controller_group.create_controller_link_sequence(self)
         if self._is_responder_correct() is False:
             if self._adoptable_responder_key() is not None:
-                self._responder_key = self._adoptable_responder_key()
+                self.set_responder_key(self._adoptable_responder_key())
             else:
                 responder_sequence = self.responder_group.create_responder_link_sequence(self)
         if responder_sequence is not None and controller_sequence is not None:
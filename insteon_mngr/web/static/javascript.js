@@ -495,7 +495,7 @@ function updateNavigation (data) {
   }
   if ($('li#navModemGroup').length) {
     var modemGroup = getModemGroup()
-    $('li#navModemGroup').html(`${data[modemAddress]['groups'][modemGroup]['name']} - ${modemGroup}`)
+    $('li#navModemGroup').html(`${getModemGroupData(data, modemAddress, modemGroup)['name']} - ${modemGroup}`)
   }
   if ($('li#navDeviceGroup').length) {
     var deviceGroup = getDeviceGroup()
@@ -583,13 +583,18 @@ function updateModemPage (data) {
   registerAddDevice()
 }
 
+function getModemGroupData (data, modemAddress, groupNumber) {
+  // Modem groups which have not been used yet are not listed
+  return data[modemAddress]['groups'][groupNumber] || {'name': ''}
+}
+
 function updateModemGroupPage (data) {
   var modemAddress = getModemAddress()
   if ($('form#modemGroupSettings').length) {
     var groupNumber = getModemGroup()
     $('form#modemGroupSettings').html('')
     $('form#modemGroupSettings').append(createFormElement(
-      'Scene Name', 'name', 'text', data[modemAddress]['groups'][groupNumber]['name'])
+      'Scene Name', 'name', 'text', getModemGroupData(data, modemAddress, groupNumber)['name'])
     )
     $('form#modemGroupSettings').append(`
       <button type="button" id="modemGroupSettingsSubmit" class="btn btn-margin btn-default btn-block">
@@ -0,0 +1,30 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr.aldb
+
+class CompactALDBTest(unittest.TestCase):
+    '''Round trips records through the compact encoding'''
+    def test_round_trip(self):
+        records = {
+            '0FFF': bytearray.fromhex('E201AABBCC00001F'),
+            '0FF7': bytearray.fromhex('A2011122330000FF')
+        }
+        blob = insteon_mngr.aldb.encode_records(records)
+        self.assertEqual(len(blob), 28)
+        self.assertEqual(insteon_mngr.aldb.decode_records(blob), records)
+
+    def test_modem_keys(self):
+        records = {'0010': bytearray.fromhex('E201AABBCC00001F')}
+        blob = insteon_mngr.aldb.encode_records(records)
+        self.assertEqual(insteon_mngr.aldb.decode_records(blob), records)
+
+    def test_unsupported(self):
+        records = {'10000': bytearray(8)}
+        self.assertIsNone(insteon_mngr.aldb.encode_records(records))
+        records = {'0FFF': bytearray(9)}
+        self.assertIsNone(insteon_mngr.aldb.encode_records(records))
+
+if __name__ == '__main__':
+    unittest.main()
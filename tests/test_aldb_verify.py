@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+from insteon_mngr.insteon_device import TRUST_WINDOW
+from insteon_mngr.sequences import VerifyDeviceALDBi2
+
+class ALDBVerifyTest(unittest.TestCase):
+    '''Trusts a recently verified aldb and patches a changed one'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        device = {'dev_cat': 0x02, 'sub_cat': 0x2A, 'firmware': 0x41,
+                  'engine_version': 2, 'aldb_delta': 1,
+                  'aldb_verified_time': time.time(),
+                  'aldb': {'0FFF': 'A201AABBCC000000',
+                           '0FF7': 'E201AABBCC000000',
+                           '0FEF': '0000000000000000'}}
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': {'0FFF': 'E201112233000000'},
+                       'devices': {'112233': device}}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.device = self.core.get_device_by_addr('112233')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def last_read(self):
+        msg = self.device.out_queue[-1]
+        return '%02X%02X' % (msg.get_byte_by_name('msb'),
+                             msg.get_byte_by_name('lsb'))
+
+    def rcvd_record(self, sequence, key, raw):
+        '''Stands in for the extended message carrying the record'''
+        self.device.aldb.get_record(key).edit_record(bytearray.fromhex(raw))
+        sequence._record_read(key, int(key[0:2], 16), int(key[2:4], 16))
+
+    def test_trusted(self):
+        aldb = self.device.aldb
+        self.assertTrue(aldb.is_trusted())
+        self.device.attribute('aldb_verified_time',
+                              time.time() - TRUST_WINDOW - 1)
+        self.assertFalse(aldb.is_trusted())
+        self.device.attribute('aldb_trust_window', TRUST_WINDOW * 2)
+        self.assertTrue(aldb.is_trusted())
+
+    def test_patch_scan(self):
+        sequence = VerifyDeviceALDBi2(device=self.device, changes=1)
+        sequence.start()
+        # The unused slot is read first, a link was written to it
+        self.assertEqual(self.last_read(), '0FEF')
+        self.rcvd_record(sequence, '0FEF', 'E201DDEEFF000000')
+        # So the end of the database moved down
+        self.assertEqual(self.last_read(), '0FE7')
+        self.rcvd_record(sequence, '0FE7', '0000000000000000')
+        # One change was patched, the other records are not read
+        self.assertEqual(sequence._read, set(['0FEF', '0FE7']))
+        self.assertEqual(sequence._patched, 1)
+        self.assertEqual(
+            self.device.aldb.get_record('0FFF').get_linked_device_str(),
+            'AABBCC')
+        self.assertEqual(
+            self.device.aldb.get_record('0FEF').get_linked_device_str(),
+            'DDEEFF')
+
+    def test_failed_read(self):
+        sequence = VerifyDeviceALDBi2(device=self.device, changes=1)
+        sequence.start()
+        self.device.out_queue[-1].failed = True
+        # Falls back to reading the whole aldb
+        self.assertFalse(sequence.is_complete)
+        self.assertEqual(self.last_read(), '0000')
+        self.assertEqual(len(self.device.aldb.aldb), 0)
+        self.device.out_queue[-1].failed = True
+        self.assertTrue(sequence.is_complete)
+        self.assertFalse(sequence.is_success)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.devices import (select_classes, DimmerFunctions,
+                                  DimmerGroup, GenericFunctions)
+from insteon_mngr.devices.catalog import get_catalog
+
+
+class TestCatalog(unittest.TestCase):
+
+    def test_shared(self):
+        self.assertIs(get_catalog(), get_catalog())
+        self.assertIs(select_classes(0x01, 0x20), select_classes(0x01, 0x20))
+
+    def test_entry(self):
+        entry = select_classes(0x01, 0x20)
+        self.assertEqual(entry['category']['type'], 'dimmer')
+        self.assertEqual(entry['model']['name'], 'SwitchLinc Dimmer (Dual-Band)')
+        self.assertIs(entry['device']['functions'], DimmerFunctions)
+        self.assertIs(entry['group'], DimmerGroup)
+
+    def test_unknown(self):
+        entry = select_classes(0xFE, 0xFE)
+        self.assertIsNone(entry['category'])
+        self.assertIsNone(entry['model'])
+        self.assertIs(entry['device']['functions'], GenericFunctions)
+
+
+if __name__ == '__main__':
+    unittest.main()
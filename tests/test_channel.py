@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+class ChannelTest(unittest.TestCase):
+    '''Holds sends while the powerline is busy'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        device = {'dev_cat': 0x02, 'sub_cat': 0x2A, 'firmware': 0x41,
+                  'engine_version': 2, 'aldb_delta': 1,
+                  'aldb_verified_time': time.time(), 'aldb': {}}
+        # Nothing listens on port 1, so the modem sends nothing until the
+        # test says its port is ready
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': {'0FFF': 'E201112233000000'},
+                       'devices': {'112233': device}}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.modem = self.core.get_device_by_addr('AABBCC')
+        self.modem._is_port_ready = lambda: True
+        self.sent = []
+        self.modem._send_msg = self.sent.append
+        self.device = self.core.get_device_by_addr('112233')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hold_only_when_sending(self):
+        channel = self.modem.channel
+        channel.frame_rcvd('standard', 3)
+        self.modem.process_queue()
+        self.assertEqual(channel.get_stats()['holds'], 0)
+        self.device.send_handler.get_engine_version()
+        self.modem.process_queue()
+        self.assertEqual(channel.get_stats()['holds'], 1)
+        self.assertEqual(self.sent, [])
+        channel._busy_until = 0
+        self.modem.process_queue()
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(self.device.out_queue), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import http.server
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+# An empty hub buffer
+BUFFER = '<response><BS>' + '0' * 202 + '</BS></response>'
+
+class HubHandler(http.server.BaseHTTPRequestHandler):
+    '''Answers like a hub, keeping connections alive.  Requests for /slow
+    are answered after a second.'''
+    protocol_version = 'HTTP/1.1'
+    # The headers and body are written separately
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append((self.path,
+                                     self.headers.get('Authorization')))
+        if self.path == '/slow':
+            time.sleep(1)
+        body = b''
+        if self.path == '/buffstatus.xml':
+            body = BUFFER.encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The hub gave up waiting
+            pass
+
+    def log_message(self, *args):
+        pass
+
+class HubTest(unittest.TestCase):
+    '''Runs a Hub against a local http stand-in'''
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      HubHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.directory = tempfile.mkdtemp()
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.hub = self.core.add_hub(ip='127.0.0.1',
+                                     port=self.server.server_address[1],
+                                     user='user', password='pass',
+                                     device_id='AABBCC')
+
+    def tearDown(self):
+        self.core.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def wait_for_requests(self, count):
+        end_time = time.time() + 3
+        while (len(self.server.requests) < count and
+               time.time() < end_time):
+            time.sleep(.05)
+
+    def test_session_reuse(self):
+        self.wait_for_requests(5)
+        self.assertGreaterEqual(len(self.server.requests), 5)
+        self.assertEqual(self.server.connections, 1)
+        for _, auth in self.server.requests:
+            self.assertEqual(auth, 'Basic dXNlcjpwYXNz')
+
+    def test_reconnect_after_timeout(self):
+        self.wait_for_requests(1)
+        with self.hub._buffer_lock:
+            self.assertIsNone(self.hub._request('slow', '/slow', .2))
+            self.assertIsNone(self.hub._session)
+            self.assertFalse(self.hub._is_port_ready())
+            response = self.hub._request('buffstatus', '/buffstatus.xml', 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.hub._is_port_ready())
+        self.assertEqual(self.server.connections, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import contextlib
+import io
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.hub import HubBufferReader, RING_LENGTH
+
+def buffstatus(ring, end_pos):
+    return '<response><BS>%s%02X</BS></response>' % (ring, end_pos)
+
+def write(ring, start, hex_string):
+    '''Writes hex_string into the ring from start, wrapping around'''
+    ring = list(ring)
+    for i, char in enumerate(hex_string):
+        ring[(start + i) % RING_LENGTH] = char
+    return ''.join(ring)
+
+class HubBufferReaderTest(unittest.TestCase):
+    '''Finds the bytes added to the hub buffer between polls'''
+    def setUp(self):
+        self.reader = HubBufferReader()
+        self.ring = 'A' * RING_LENGTH
+        self.end_pos = 180
+        # The first read only sets the position
+        self.assertEqual(self.read(), bytearray())
+
+    def read(self):
+        return self.reader.read(buffstatus(self.ring, self.end_pos))
+
+    def add(self, hex_string):
+        self.ring = write(self.ring, self.end_pos, hex_string)
+        self.end_pos = (self.end_pos + len(hex_string)) % RING_LENGTH
+
+    def test_new_bytes(self):
+        self.add('0250112233')
+        self.assertEqual(self.read(), bytearray.fromhex('0250112233'))
+        self.assertEqual(self.read(), bytearray())
+        self.assertEqual(self.reader.bytes_read, 5)
+        self.assertEqual(self.reader.overflows, 0)
+
+    def test_wrap_around(self):
+        self.add('0250112233AABBCC2B1900')
+        self.assertEqual(self.end_pos, 2)
+        self.assertEqual(self.read(),
+                         bytearray.fromhex('0250112233AABBCC2B1900'))
+        self.assertEqual(self.reader.overflows, 0)
+
+    def test_overflow(self):
+        self.add('02' * 80)
+        # Overwrites the bytes before the last read position
+        self.add('03' * 30)
+        self.assertEqual(self.read(),
+                         bytearray.fromhex(self.ring[self.end_pos:] +
+                                           self.ring[:self.end_pos]))
+        self.assertEqual(self.reader.overflows, 1)
+
+    def test_full_lap(self):
+        self.add('02' * (RING_LENGTH // 2))
+        self.assertEqual(self.end_pos, 180)
+        self.assertEqual(self.read(), bytearray.fromhex('02' * 100))
+        self.assertEqual(self.reader.overflows, 1)
+        # An unchanged ring at the same position is not an overflow
+        self.assertEqual(self.read(), bytearray())
+        self.assertEqual(self.reader.overflows, 1)
+
+    def test_reset(self):
+        # The hub clears its buffer after a command
+        self.reader.reset()
+        self.ring = '0' * RING_LENGTH
+        self.end_pos = 0
+        self.add('0262112233')
+        self.assertEqual(self.read(), bytearray.fromhex('0262112233'))
+        self.assertEqual(self.reader.overflows, 0)
+
+    def test_bad_responses(self):
+        bad = [
+            'not xml',
+            '<response><BS>',
+            '<response><BS>0262</BS></response>',
+            buffstatus('Z' * RING_LENGTH, 0),
+            buffstatus('0_' * (RING_LENGTH // 2), 0),
+            buffstatus('0x' * (RING_LENGTH // 2), 0),
+            buffstatus(self.ring, RING_LENGTH),
+        ]
+        for text in bad:
+            self.assertIsNone(self.reader.read(text))
+        self.assertEqual(self.reader.bad_responses, len(bad))
+        # The last good snapshot is kept
+        self.add('0250112233')
+        self.assertEqual(self.read(), bytearray.fromhex('0250112233'))
+
+    def test_overflow_warning(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for i in range(3):
+                self.add('0%d' % i * (RING_LENGTH // 2))
+                self.read()
+        self.assertEqual(self.reader.overflows, 3)
+        self.assertEqual(output.getvalue().count('overflowed'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import socket
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr.socket_transport
+
+class TCPTransportTest(unittest.TestCase):
+    '''Runs the transport against a local TCP stand-in for the hub'''
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.server.settimeout(2)
+        port = self.server.getsockname()[1]
+        self.connects = 0
+        self.transport = insteon_mngr.socket_transport.TCPTransport(
+            '127.0.0.1', port, on_connect=self.on_connect)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.close()
+
+    def on_connect(self):
+        self.connects += 1
+
+    def read_until(self, length):
+        ret = bytearray()
+        end_time = time.time() + 2
+        while len(ret) < length and time.time() < end_time:
+            ret.extend(self.transport.read())
+            time.sleep(.01)
+        return ret
+
+    def accept(self):
+        self.transport.read()
+        client, _ = self.server.accept()
+        client.settimeout(2)
+        self.read_until(0)
+        return client
+
+    def test_stream(self):
+        client = self.accept()
+        self.assertTrue(self.transport.connected)
+        self.transport.write(bytes.fromhex('0260'))
+        self.assertEqual(client.recv(2), bytes.fromhex('0260'))
+        client.sendall(bytes.fromhex('02601CB587030F9B06'))
+        self.assertEqual(self.read_until(9),
+                         bytearray.fromhex('02601CB587030F9B06'))
+        client.close()
+
+    def test_reconnect(self):
+        client = self.accept()
+        client.close()
+        end_time = time.time() + .5
+        while self.transport.disconnects == 0 and time.time() < end_time:
+            self.transport.read()
+        self.assertFalse(self.transport.connected)
+        self.assertEqual(self.transport.disconnects, 1)
+        # The first reconnection attempt waits a second
+        time.sleep(1.1)
+        client = self.accept()
+        self.assertTrue(self.transport.connected)
+        self.assertEqual(self.connects, 2)
+        client.close()
+
+if __name__ == '__main__':
+    unittest.main()
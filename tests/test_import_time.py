@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+# append parent directory to import path
+import env
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Budgets in seconds for a cold interpreter, generous for slow machines
+IMPORT_BUDGET = .5
+START_BUDGET = 1
+# Modules which should only be imported when they are used
+LAZY_MODULES = ('bottle', 'requests', 'serial', 'pkg_resources', 'sqlite3',
+                'insteon_mngr.config_server', 'insteon_mngr.hub')
+
+class ImportTimeTest(unittest.TestCase):
+    '''Times the import and headless startup in a fresh interpreter'''
+    def run_python(self, code):
+        environ = os.environ.copy()
+        environ['PYTHONPATH'] = ROOT
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=environ, cwd=ROOT)
+        for line in output.decode().splitlines():
+            if line.startswith('result'):
+                return line.split(' ')[1:]
+
+    def test_import(self):
+        code = (
+            'import sys, time\n'
+            'start = time.time()\n'
+            'import insteon_mngr\n'
+            'seconds = time.time() - start\n'
+            'print(\'result\', seconds,\n'
+            '      *[name for name in %r if name in sys.modules])'
+        ) % (LAZY_MODULES,)
+        result = self.run_python(code)
+        self.assertLess(float(result[0]), IMPORT_BUDGET)
+        self.assertEqual(result[1:], [])
+
+    def test_headless_start(self):
+        with tempfile.TemporaryDirectory() as config_path:
+            code = (
+                'import sys, time\n'
+                'start = time.time()\n'
+                'import insteon_mngr\n'
+                'core = insteon_mngr.Insteon_Core(%r, web_server=False)\n'
+                'seconds = time.time() - start\n'
+                'core.close()\n'
+                'print(\'result\', seconds,\n'
+                '      *[name for name in %r if name in sys.modules])'
+            ) % (config_path, LAZY_MODULES)
+            result = self.run_python(code)
+        self.assertLess(float(result[0]), START_BUDGET)
+        self.assertEqual(result[1:], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr.aldb
+import insteon_mngr.journal
+
+class JournalTest(unittest.TestCase):
+    '''Replays a journal over a saved config'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json.journal')
+        self.journal = insteon_mngr.journal.Journal(self.path)
+        self.config = {'modems': {'AABBCC': {
+            'type': 'plm',
+            'devices': {
+                '112233': {'name': 'old', 'aldb': {}},
+                '445566': {'name': 'gone', 'aldb': {}}
+            }
+        }}}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay(self):
+        self.journal.append('AABBCC', '112233', 'attributes', {'name': 'new'})
+        self.journal.append('AABBCC', '112233', 'aldb',
+                            {'0FFF': 'E201AABBCC00001F'})
+        self.journal.append('AABBCC', None, 'devices', ['112233'])
+        config = self.journal.replay(self.config)
+        devices = config['modems']['AABBCC']['devices']
+        self.assertEqual(list(devices.keys()), ['112233'])
+        self.assertEqual(devices['112233'],
+                         {'name': 'new', 'aldb': {'0FFF': 'E201AABBCC00001F'}})
+
+    def test_damaged_entry(self):
+        self.journal.append('AABBCC', '112233', 'attributes', {'name': 'new'})
+        with open(self.path, 'a') as outfile:
+            outfile.write('{"modem": "AAB')
+        config = self.journal.replay(self.config)
+        device = config['modems']['AABBCC']['devices']['112233']
+        self.assertEqual(device['name'], 'new')
+
+    def test_compaction(self):
+        self.journal.append('AABBCC', '112233', 'attributes', {'name': 'a'})
+        first = self.journal.rotate()
+        self.journal.append('AABBCC', '112233', 'attributes', {'name': 'b'})
+        second = self.journal.rotate()
+        # The older config is written after the newer rotation
+        self.journal.compacted(first)
+        config = self.journal.replay(self.config)
+        device = config['modems']['AABBCC']['devices']['112233']
+        self.assertEqual(device['name'], 'b')
+        self.journal.compacted(second)
+        self.assertFalse(os.path.exists(self.path + '.1'))
+
+    def test_aldb_records(self):
+        devices = self.config['modems']['AABBCC']['devices']
+        devices['112233']['aldb'] = {'0FFF': 'E201AABBCC00001F',
+                                     '0FF7': 'E202AABBCC00001F'}
+        devices['445566']['aldb'] = insteon_mngr.aldb.encode_records(
+            {'0FFF': bytearray.fromhex('E201AABBCC00001F')})
+        self.journal.append('AABBCC', '112233', 'aldb_records',
+                            {'0FF7': '2202AABBCC00001F'})
+        self.journal.append('AABBCC', '445566', 'aldb_records',
+                            {'0FF7': 'E203AABBCC00001F'})
+        config = self.journal.replay(self.config)
+        devices = config['modems']['AABBCC']['devices']
+        self.assertEqual(devices['112233']['aldb'],
+                         {'0FFF': 'E201AABBCC00001F',
+                          '0FF7': '2202AABBCC00001F'})
+        self.assertEqual(devices['445566']['aldb'],
+                         {'0FFF': 'E201AABBCC00001F',
+                          '0FF7': 'E203AABBCC00001F'})
+
+if __name__ == '__main__':
+    unittest.main()
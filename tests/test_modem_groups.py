@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+class ModemGroupTest(unittest.TestCase):
+    '''Modem groups are only created when they are used'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        device = {'dev_cat': 0x02, 'sub_cat': 0x2A, 'firmware': 0x41,
+                  'engine_version': 2, 'aldb_delta': 1,
+                  'aldb_verified_time': time.time(), 'aldb': {}}
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       # A controller of group 1 and a responder naming
+                       # group 10, which is not used
+                       'aldb': {'0FFF': 'E201112233000000',
+                                '0FF7': 'A201112233000010'},
+                       'groups': {'5': {'name': 'scene'}},
+                       'devices': {'112233': device}}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.modem = self.core.get_device_by_addr('AABBCC')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def group_numbers(self):
+        return sorted(group.group_number
+                      for group in self.modem.get_all_groups())
+
+    def test_used_groups_created(self):
+        self.assertEqual(self.group_numbers(), [1, 5])
+        self.assertEqual(
+            self.modem.get_object_by_group_num(5).attribute('name'), 'scene')
+
+    def test_lookup_does_not_create(self):
+        self.assertIsNone(self.modem.get_object_by_group_num(20))
+        self.assertEqual(self.group_numbers(), [1, 5])
+        record = self.modem.aldb.get_record('0FF7')
+        self.assertEqual(record.status(), 'bad_group')
+        self.assertEqual(self.group_numbers(), [1, 5])
+
+    def test_get_or_create(self):
+        group = self.modem.get_or_create_group(20)
+        self.assertIs(self.modem.get_object_by_group_num(20), group)
+        self.assertIsNone(self.modem.get_or_create_group(0))
+        self.assertIsNone(self.modem.get_or_create_group(255))
+        self.assertEqual(self.group_numbers(), [1, 5, 20])
+
+    def test_save_groups(self):
+        self.modem.get_or_create_group(20)
+        self.assertEqual(self.modem.save_groups(), {5: {'name': 'scene'}})
+        # Saving does not add the unused groups to the loaded config
+        self.assertNotIn(20, self.modem._groups_config)
+
+if __name__ == '__main__':
+    unittest.main()
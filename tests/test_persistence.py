@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+class JSONStoreTest(unittest.TestCase):
+    '''Writes the state of a core to config.json'''
+    def setUp(self):
+        self.threads = set(threading.enumerate())
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'config.json')
+        # Accepts the connection of the modem but never answers
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        config = {'modems': {'AABBCC': {
+            'type': 'plm',
+            'port': 'tcp://127.0.0.1:%d' % self.server.getsockname()[1],
+            'aldb': {'0001': 'E201112200000000'},
+            'devices': {'112233': {'dev_cat': 0x02, 'sub_cat': 0x2A,
+                                   'firmware': 0x41, 'engine_version': 2}}
+        }}}
+        with open(self.path, 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+
+    def tearDown(self):
+        self.core.close()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def read_name(self):
+        with open(self.path, 'r') as infile:
+            config = json.loads(infile.read())
+        return config['modems']['AABBCC']['devices']['112233'].get('name')
+
+    def test_failed_write(self):
+        store = self.core.store
+        device = self.core.get_device_by_addr('112233')
+        device.attribute('name', 'new')
+        # The temporary file cannot be opened
+        os.mkdir(self.path + '.tmp')
+        store.save(self.core.get_all_modems(), is_exit=True)
+        self.assertTrue(store._has_changes())
+        self.assertIsNone(self.read_name())
+        os.rmdir(self.path + '.tmp')
+        # Nothing else changed, the failed snapshot is written again
+        store.save(self.core.get_all_modems(), is_exit=True)
+        self.assertFalse(store._has_changes())
+        self.assertEqual(self.read_name(), 'new')
+
+    def test_close(self):
+        self.core.get_device_by_addr('112233').attribute('name', 'closed')
+        self.core.close()
+        self.assertEqual(set(threading.enumerate()) - self.threads, set())
+        self.assertEqual(self.read_name(), 'closed')
+
+if __name__ == '__main__':
+    unittest.main()
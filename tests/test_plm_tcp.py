@@ -0,0 +1,126 @@
+import socket
+import threading
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr.plm
+from insteon_mngr.scene_map import SceneMap
+from insteon_mngr.channel import ChannelEstimator
+from insteon_mngr.router import Router
+
+# The response of a PLM with address AABBCC to a get info command
+PLM_INFO = bytes.fromhex('0260AABBCC03150006')
+GET_FIRST_RECORD = bytes.fromhex('0269')
+NO_RECORDS = bytes.fromhex('026915')
+
+class CoreStandIn(object):
+    '''The parts of the core used by a modem which has no devices'''
+    def __init__(self):
+        self.scene_map = SceneMap()
+        self.channel = ChannelEstimator()
+        self.router = Router(self)
+
+    def get_channel(self, powerline=None):
+        return self.channel
+
+    def get_all_modems(self):
+        return []
+
+    def state_changed(self, root, section=None, record=None):
+        pass
+
+    def get_device_by_addr(self, addr):
+        return None
+
+    def get_user_links_for_this_controller(self, controller_group):
+        return []
+
+    def get_user_links_for_this_controller_device(self, controller_device):
+        return {}
+
+class PLMStandIn(object):
+    '''A local socket server which answers like a PLM on a serial bridge.
+    The first drop_connections connections are closed as soon as a command
+    arrives, without an answer.'''
+    def __init__(self, drop_connections=0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.server.settimeout(5)
+        self.port = self.server.getsockname()[1]
+        self.drop_connections = drop_connections
+        self.received = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with client:
+                self.answer(client)
+
+    def answer(self, client):
+        while True:
+            try:
+                command = client.recv(2)
+            except OSError:
+                return
+            if not command:
+                return
+            self.received.append(command)
+            if self.drop_connections > 0:
+                self.drop_connections -= 1
+                return
+            if command == PLM_INFO[0:2]:
+                client.sendall(PLM_INFO)
+            elif command == GET_FIRST_RECORD:
+                client.sendall(NO_RECORDS)
+
+    def close(self):
+        self.server.close()
+
+class PLMOverTCPTest(unittest.TestCase):
+    def run_plm(self, stand_in, seconds, done=None):
+        plm = insteon_mngr.plm.PLM(
+            CoreStandIn(), port='tcp://127.0.0.1:' + str(stand_in.port))
+        if done is None:
+            done = lambda plm: plm.dev_addr_str == 'AABBCC'
+        end_time = time.time() + seconds
+        while not done(plm) and time.time() < end_time:
+            plm.process_input()
+            plm.process_unacked_msg()
+            plm.process_queue()
+            time.sleep(.01)
+        plm.transport.close()
+        stand_in.close()
+        return plm
+
+    def test_plm_info(self):
+        stand_in = PLMStandIn()
+        plm = self.run_plm(stand_in, 2)
+        self.assertEqual(plm.dev_addr_str, 'AABBCC')
+        self.assertEqual(stand_in.received[0], PLM_INFO[0:2])
+
+    def test_resend_after_reconnect(self):
+        stand_in = PLMStandIn(drop_connections=1)
+        plm = self.run_plm(stand_in, 4)
+        self.assertEqual(plm.dev_addr_str, 'AABBCC')
+        self.assertEqual(plm.transport.disconnects, 1)
+        self.assertEqual(stand_in.received[0:2], [PLM_INFO[0:2]] * 2)
+
+    def test_end_of_aldb_keeps_rate(self):
+        stand_in = PLMStandIn()
+        plm = self.run_plm(
+            stand_in, 3,
+            done=lambda plm: (GET_FIRST_RECORD in stand_in.received and
+                          plm.is_idle()))
+        self.assertIn(GET_FIRST_RECORD, stand_in.received)
+        self.assertEqual(plm.pacer.backoff_count, 0)
+        self.assertEqual(plm.pacer.send_rate, plm.pacer.max_rate)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+import insteon_mngr.modem
+from insteon_mngr.router import Router
+
+class RecordStandIn(object):
+    def __init__(self, linked_id):
+        self.linked_id = linked_id
+
+    def parse_record(self):
+        return {'in_use': True}
+
+    def get_linked_device_str(self):
+        return self.linked_id
+
+class ALDBStandIn(object):
+    def __init__(self, linked_ids):
+        self.aldb = {}
+        for i, linked_id in enumerate(linked_ids):
+            self.aldb['%04X' % (0x0FFF - i * 8)] = RecordStandIn(linked_id)
+
+class ModemStandIn(object):
+    def __init__(self, address):
+        self.dev_addr_str = address
+        self.port_ready = True
+
+    def _is_port_ready(self):
+        return self.port_ready
+
+class DeviceStandIn(object):
+    def __init__(self, plm, linked_ids):
+        self.dev_addr_str = '112233'
+        self.plm = plm
+        self.aldb = ALDBStandIn(linked_ids)
+        self.out_queue = []
+        self.smart_hops = 1
+
+class InsteonMsgStandIn(object):
+    def __init__(self, to_addr_str):
+        self.to_addr_str = to_addr_str
+
+class MsgStandIn(object):
+    def __init__(self, device=None, plm=None, to_addr_str=None):
+        self.device = device
+        self.plm = plm
+        self.insteon_msg = InsteonMsgStandIn(to_addr_str)
+
+class CoreStandIn(object):
+    def __init__(self, modems):
+        self.modems = modems
+
+    def get_all_modems(self):
+        return self.modems
+
+class RouterTest(unittest.TestCase):
+    '''Picks the modem used for each device'''
+    def setUp(self):
+        self.modem = ModemStandIn('AABBCC')
+        self.other = ModemStandIn('DDEEFF')
+        self.router = Router(CoreStandIn([self.modem, self.other]))
+
+    def test_own_modem_preferred(self):
+        device = DeviceStandIn(self.modem, ['AABBCC', 'DDEEFF'])
+        self.assertIs(self.router.get_modem(device), self.modem)
+
+    def test_unlinked_modem_not_used(self):
+        device = DeviceStandIn(self.modem, ['AABBCC'])
+        self.modem.port_ready = False
+        self.assertIs(self.router.get_modem(device), self.modem)
+
+    def test_linked_modem_used_when_own_is_down(self):
+        device = DeviceStandIn(self.modem, ['AABBCC', 'DDEEFF'])
+        self.modem.port_ready = False
+        self.assertIs(self.router.get_modem(device), self.other)
+
+    def test_link_cache_cleared_on_aldb_change(self):
+        device = DeviceStandIn(self.modem, ['AABBCC'])
+        self.modem.port_ready = False
+        self.assertIs(self.router.get_modem(device), self.modem)
+        device.aldb = ALDBStandIn(['AABBCC', 'DDEEFF'])
+        self.router.aldb_changed(device)
+        self.assertIs(self.router.get_modem(device), self.other)
+
+    def test_failover(self):
+        device = DeviceStandIn(self.modem, ['AABBCC', 'DDEEFF'])
+        msg = MsgStandIn(device=device)
+        device.out_queue.append(msg)
+        self.router.msg_sent(device, self.modem, msg)
+        self.assertTrue(self.router.failover(msg, self.modem))
+        # The modem which has not tried the message is picked next
+        self.assertIs(self.router.get_modem(device), self.other)
+        self.router.msg_sent(device, self.other, msg)
+        self.assertFalse(self.router.failover(msg, self.other))
+        self.assertLess(self.router.get_routes(device)['AABBCC']['success'],
+                        1)
+
+    def test_no_failover_without_link(self):
+        device = DeviceStandIn(self.modem, ['AABBCC'])
+        msg = MsgStandIn(device=device)
+        self.router.msg_sent(device, self.modem, msg)
+        self.assertFalse(self.router.failover(msg, self.modem))
+
+    def test_sending_modem(self):
+        # A cleanup ack heard by the other modem, addressed to this one
+        msg = MsgStandIn(plm=self.other, to_addr_str='AABBCC')
+        self.assertIs(self.router.get_sending_modem(msg), self.modem)
+        msg = MsgStandIn(plm=self.other, to_addr_str='445566')
+        self.assertIs(self.router.get_sending_modem(msg), self.other)
+
+class ModemRoutingTest(unittest.TestCase):
+    '''Sends messages for a device through a modem other than its own'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        device = {'dev_cat': 0x02, 'sub_cat': 0x2A, 'firmware': 0x41,
+                  'engine_version': 2, 'aldb_delta': 1,
+                  'aldb_verified_time': time.time(),
+                  'aldb': {'0FFF': 'A201AABBCC000000',
+                           '0FF7': 'A201DDEEFF000000'}}
+        # Nothing listens on port 1, so the ports are never ready and the
+        # modems send nothing
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': {'0FFF': 'E201112233000000'},
+                       'devices': {'112233': device}},
+            'DDEEFF': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': {'0FFF': 'E201112233000000'},
+                       'devices': {}}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.modem = self.core.get_device_by_addr('AABBCC')
+        self.other = self.core.get_device_by_addr('DDEEFF')
+        self.device = self.core.get_device_by_addr('112233')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_queued_through_other_modem(self):
+        self.other._is_port_ready = lambda: True
+        self.assertTrue(self.other.is_idle())
+        self.device.send_handler.get_engine_version()
+        self.assertIn(self.device, self.modem._queued_devices)
+        self.assertEqual(self.other._get_routed_devices(), [self.device])
+        self.assertFalse(self.other.is_idle())
+        self.assertTrue(self.modem.is_idle())
+        self.device.out_queue.pop(0)
+        self.assertTrue(self.other.is_idle())
+        self.assertNotIn(self.device, self.modem._queued_devices)
+
+    def test_scene_ack_heard_by_other_modem(self):
+        acked = []
+        self.modem.scene_responder_acked = \
+            lambda device, group: acked.append((device, group))
+        # A cleanup ack from 112233 to AABBCC for group 1, heard by DDEEFF
+        self.other._process_inc_msg(
+            bytearray.fromhex('0250112233AABBCC6F1101'))
+        self.assertEqual(acked, [(self.device, 1)])
+
+    def expire_held_msgs(self):
+        # Every queued message is older than the hold time
+        max_hold_time = insteon_mngr.modem.MAX_HOLD_TIME
+        insteon_mngr.modem.MAX_HOLD_TIME = -1
+        try:
+            # As process_queue does for the modems which are down
+            for modem in (self.modem, self.other):
+                if not modem._is_port_ready():
+                    modem._expire_held_msgs()
+        finally:
+            insteon_mngr.modem.MAX_HOLD_TIME = max_hold_time
+
+    def test_held_msgs_kept_while_routed_elsewhere(self):
+        self.other._is_port_ready = lambda: True
+        self.device.send_handler.get_engine_version()
+        self.expire_held_msgs()
+        # The other modem will send it, the own modem being down
+        self.assertEqual(len(self.device.out_queue), 1)
+
+    def test_held_msgs_expired(self):
+        self.device.send_handler.get_engine_version()
+        msg = self.device.out_queue[0]
+        self.expire_held_msgs()
+        self.assertEqual(len(self.device.out_queue), 0)
+        self.assertTrue(msg.failed)
+
+if __name__ == '__main__':
+    unittest.main()
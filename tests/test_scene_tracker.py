@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+RESPONDERS = ('112233', '445566')
+
+class SceneTrackerTest(unittest.TestCase):
+    '''Follows the cleanup acks of a modem scene with two responders'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        devices = {}
+        aldb = {}
+        for i, address in enumerate(RESPONDERS):
+            devices[address] = {'dev_cat': 0x02, 'sub_cat': 0x2A,
+                                'firmware': 0x41, 'engine_version': 2,
+                                'aldb_delta': 1,
+                                'aldb_verified_time': time.time(),
+                                'aldb': {}}
+            aldb['%04X' % (0x0FFF - i * 8)] = 'E201' + address + '000000'
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': aldb, 'devices': devices}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.modem = self.core.get_device_by_addr('AABBCC')
+        self.modem._is_port_ready = lambda: True
+        self.written = []
+        self.modem._write_to_port = self.written.append
+        self.group = self.modem.get_object_by_group_num(1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def send_scene(self, state):
+        '''Sends a scene command and returns its tracker'''
+        self.group.set_state(state)
+        # The cleanup acks of the last scene hold the channel
+        self.modem.channel._busy_until = 0
+        self.modem.process_queue()
+        return self.modem._last_sent_msg.scene_tracker
+
+    def rcvd(self, hex_string):
+        self.modem._process_inc_msg(bytearray.fromhex(hex_string))
+
+    def echo_ack(self):
+        self.modem._process_inc_msg(bytearray(self.written[-1]) +
+                                    bytearray.fromhex('06'))
+
+    def cleanup_ack(self, address):
+        self.rcvd('0250' + address + 'AABBCC6F1101')
+
+    def release_early(self):
+        tracker = self.send_scene('ON')
+        self.echo_ack()
+        for address in RESPONDERS:
+            self.cleanup_ack(address)
+        return tracker
+
+    def test_early_release(self):
+        tracker = self.release_early()
+        self.assertTrue(tracker.is_complete)
+        self.assertTrue(tracker.released_early)
+        self.assertFalse(self.modem._is_ack_pending())
+        self.assertIs(self.modem._early_scene, tracker)
+
+    def test_late_status(self):
+        self.release_early()
+        tracker = self.send_scene('OFF')
+        # The status of the first scene arrives after the next was sent
+        self.rcvd('025806')
+        self.assertFalse(tracker.is_complete)
+        self.assertTrue(self.modem._last_sent_msg.seq_lock)
+        self.assertIsNone(self.modem._early_scene)
+
+    def test_lost_status(self):
+        self.release_early()
+        tracker = self.send_scene('OFF')
+        self.echo_ack()
+        # The modem has moved on, the first status will not come
+        self.assertIsNone(self.modem._early_scene)
+        self.cleanup_ack(RESPONDERS[0])
+        self.rcvd('025806')
+        self.assertTrue(tracker.is_complete)
+        self.assertFalse(tracker.released_early)
+        self.assertFalse(self.modem._last_sent_msg.seq_lock)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+class SleepyDeviceTest(unittest.TestCase):
+    '''Holds the messages of a sleepy device until it wakes'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        device = {'dev_cat': 0x02, 'sub_cat': 0x2A, 'firmware': 0x41,
+                  'engine_version': 2, 'aldb_delta': 1,
+                  'aldb_verified_time': time.time(), 'aldb': {},
+                  'sleepy': True}
+        config = {'modems': {
+            'AABBCC': {'type': 'plm', 'port': 'tcp://127.0.0.1:1',
+                       'aldb': {'0FFF': 'E201112233000000'},
+                       'devices': {'112233': device}}
+        }}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory,
+                                              web_server=False)
+        self.core.close()
+        self.modem = self.core.get_device_by_addr('AABBCC')
+        self.modem._is_port_ready = lambda: True
+        self.sent = []
+        self.modem._send_msg = self.sent.append
+        self.device = self.core.get_device_by_addr('112233')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_held_until_awake(self):
+        self.device.send_handler.get_engine_version()
+        self.assertEqual(len(self.device.mailbox), 1)
+        self.modem.process_queue()
+        self.assertEqual(self.sent, [])
+        self.device._wake()
+        self.modem.process_queue()
+        self.assertEqual(len(self.sent), 1)
+
+    def test_falls_asleep_once(self):
+        sleeps = []
+        sleep = self.device.sleep
+        self.device.sleep = lambda: (sleeps.append(True), sleep())
+        self.device._wake()
+        self.device.send_handler.get_engine_version()
+        self.assertEqual(len(self.device.out_queue), 1)
+        # The device stops listening before the message is sent
+        self.device._awake_until = 0
+        for i in range(3):
+            self.modem.process_queue()
+        self.assertEqual(sleeps, [True])
+        self.assertEqual(self.sent, [])
+        self.assertEqual(len(self.device.mailbox), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+import insteon_mngr
+
+DEVICE_COUNT = 50
+
+class LazyLoadTest(unittest.TestCase):
+    '''Devices saved in sqlite are only loaded when they are used'''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # Accepts the connection of the modem but never answers, so the
+        # modem is connected and idle
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        devices = {}
+        for i in range(DEVICE_COUNT):
+            devices['1122%02X' % i] = {'dev_cat': 0x02, 'sub_cat': 0x2A,
+                                       'firmware': 0x41, 'engine_version': 2}
+        config = {'modems': {'AABBCC': {
+            'type': 'plm',
+            'port': 'tcp://127.0.0.1:%d' % self.server.getsockname()[1],
+            # A cached ALDB, so the modem does not query it
+            'aldb': {'0001': 'E201112200000000'},
+            'devices': devices
+        }}}
+        with open(os.path.join(self.directory, 'config.json'), 'w') as outfile:
+            outfile.write(json.dumps(config))
+        self.core = insteon_mngr.Insteon_Core(self.directory, storage='sqlite',
+                                              lazy_load=True, web_server=False)
+
+    def tearDown(self):
+        self.core.close()
+        self.server.close()
+        shutil.rmtree(self.directory)
+
+    def test_unloaded_while_running(self):
+        modem = self.core.get_all_modems()[0]
+        self.assertEqual(len(modem._unloaded_devices), DEVICE_COUNT)
+        self.assertTrue(modem.is_idle())
+        # Give the core loop time to run the refresher and initializer
+        time.sleep(1.5)
+        self.assertEqual(len(modem._devices), 0)
+        self.assertEqual(len(modem._unloaded_devices), DEVICE_COUNT)
+
+    def test_load_on_use(self):
+        modem = self.core.get_all_modems()[0]
+        device = self.core.get_device_by_addr('112205')
+        self.assertEqual(device.attribute('engine_version'), 2)
+        self.assertEqual(list(modem._devices.keys()), ['112205'])
+
+    def test_failed_write(self):
+        store = self.core.store
+        device = self.core.get_device_by_addr('112205')
+        device.attribute('name', 'new')
+        store._conn.execute('PRAGMA query_only = ON')
+        store.save(self.core.get_all_modems(), is_exit=True)
+        self.assertTrue(store._has_changes())
+        store._conn.execute('PRAGMA query_only = OFF')
+        # Nothing else changed, the failed statements are written again
+        store.save(self.core.get_all_modems(), is_exit=True)
+        self.assertFalse(store._has_changes())
+        conn = sqlite3.connect(os.path.join(self.directory, 'config.db'))
+        row = conn.execute('SELECT value FROM attributes WHERE owner = ? AND '
+                           'name = ?', ('112205', 'name')).fetchone()
+        conn.close()
+        self.assertEqual(json.loads(row[0]), 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
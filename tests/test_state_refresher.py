@@ -0,0 +1,105 @@
+import time
+import unittest
+# append parent directory to import path
+import env
+# now we can import the lib module
+from insteon_mngr.state_refresher import StateRefresher
+
+class GroupStandIn(object):
+    def __init__(self, state_age):
+        self.state_age = state_age
+
+    def attribute(self, name):
+        return time.time() - self.state_age
+
+class SendHandlerStandIn(object):
+    def __init__(self):
+        self.polls = 0
+
+    def get_status(self):
+        self.polls += 1
+
+class DeviceStandIn(object):
+    '''A device whose state is state_age seconds old'''
+    def __init__(self, address, state_age):
+        self.dev_addr_str = address
+        self.base_group = GroupStandIn(state_age)
+        self.send_handler = SendHandlerStandIn()
+        self.is_sleepy = False
+        self.last_rcvd_msg = None
+        self.smart_hops = 1
+
+class ModemStandIn(object):
+    def __init__(self, devices):
+        self._devices = {}
+        for device in devices:
+            self._devices[device.dev_addr_str] = device
+        self.port_ready = True
+        self.idle = True
+        self.idle_checks = 0
+
+    def _is_port_ready(self):
+        return self.port_ready
+
+    def is_idle(self):
+        self.idle_checks += 1
+        return self.idle
+
+class CoreStandIn(object):
+    def __init__(self, modems):
+        self.modems = modems
+
+    def get_all_modems(self):
+        return self.modems
+
+class StateRefresherTest(unittest.TestCase):
+    def test_poll_stalest(self):
+        fresh = DeviceStandIn('111111', 60)
+        stale = DeviceStandIn('222222', 7200)
+        refresher = StateRefresher(CoreStandIn([ModemStandIn([fresh,
+                                                              stale])]))
+        refresher.process()
+        self.assertEqual(stale.send_handler.polls, 1)
+        self.assertEqual(fresh.send_handler.polls, 0)
+
+    def test_recheck_interval(self):
+        refresher = StateRefresher(
+            CoreStandIn([ModemStandIn([DeviceStandIn('111111', 60)])]))
+        start_time = time.time()
+        refresher.process()
+        self.assertGreaterEqual(refresher._next_poll_time,
+                                start_time + refresher.recheck_interval)
+
+    def test_port_not_ready(self):
+        stale = DeviceStandIn('111111', 7200)
+        modem = ModemStandIn([stale])
+        modem.port_ready = False
+        refresher = StateRefresher(CoreStandIn([modem]))
+        refresher.process()
+        self.assertEqual(stale.send_handler.polls, 0)
+        # Polled as soon as the port is back
+        modem.port_ready = True
+        refresher.process()
+        self.assertEqual(stale.send_handler.polls, 1)
+
+    def test_idle_only_checked_when_due(self):
+        modem = ModemStandIn([DeviceStandIn('111111', 60)])
+        refresher = StateRefresher(CoreStandIn([modem]))
+        refresher.process()
+        refresher.process()
+        self.assertEqual(modem.idle_checks, 0)
+        # A stale device waits for the modem to become idle
+        stale = DeviceStandIn('222222', 7200)
+        modem._devices[stale.dev_addr_str] = stale
+        modem.idle = False
+        refresher._next_poll_time = 0
+        refresher.process()
+        refresher.process()
+        self.assertEqual(modem.idle_checks, 2)
+        self.assertEqual(stale.send_handler.polls, 0)
+        modem.idle = True
+        refresher.process()
+        self.assertEqual(stale.send_handler.polls, 1)
+
+if __name__ == '__main__':
+    unittest.main()